@@ -0,0 +1,63 @@
+import pandas as pd
+
+PAYMENT_COLUMNS = ['CN #', 'Recent Location', 'Destination', 'COD Amount', 'Booking Date', 'Payment Received']
+RETURNED_STATUSES = ['Returned to shipper', 'Being Return', 'Pickup Request Sent', 'Ready for Return']
+REQUIRED_COLUMNS = ['COD Amount', 'Payment Received', 'Recent Location']
+UNPAID_MARKERS = ['', '-']
+
+
+def load_payment_frame(file_path, ledger=None):
+    # Callers that hold the ledger pass it in and skip parsing the workbook; otherwise final.xlsx is read.
+    if ledger is not None:
+        return prepare_frame(ledger.to_dataframe(PAYMENT_COLUMNS))
+
+    columns = pd.read_excel(file_path, nrows=0).columns
+    if not all(column in columns for column in REQUIRED_COLUMNS):
+        raise ValueError("One or more required columns are missing from the sheet.")
+
+    df = pd.read_excel(
+        file_path,
+        usecols=[column for column in PAYMENT_COLUMNS if column in columns],
+        dtype={'CN #': str, 'Recent Location': str, 'Destination': str, 'Payment Received': object},
+    )
+    return prepare_frame(df)
+
+
+def prepare_frame(df):
+    for column in PAYMENT_COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+
+    df['COD Amount'] = pd.to_numeric(df['COD Amount'], errors='coerce').fillna(0.0).astype(float)
+    df['Recent Location'] = df['Recent Location'].astype('category')
+    df['Destination'] = df['Destination'].astype('category')
+    df['Booking Date'] = pd.to_datetime(df['Booking Date'], format='%d/%m/%Y', errors='coerce')
+    return df
+
+
+def summarize_payments(df):
+    active = ~df['Recent Location'].isin(RETURNED_STATUSES)
+    unpaid = df['Payment Received'].isin(UNPAID_MARKERS)
+    pending = active & unpaid & (df['COD Amount'] != 0)
+    delivered = df['Recent Location'] == 'Delivered'
+
+    cod = df['COD Amount']
+    frame = pd.DataFrame({
+        'cod': cod.where(active, 0.0),
+        'pending': cod.where(pending, 0.0),
+        'delivered_pending': cod.where(pending & delivered, 0.0),
+        'parcels': 1,
+    })
+
+    def breakdown(key):
+        return frame.groupby(key, observed=True, dropna=False).sum()
+
+    return {
+        'total_cod_amount': float(frame['cod'].sum()),
+        'pending_payment': float(frame['pending'].sum()),
+        'delivered_pending': float(frame['delivered_pending'].sum()),
+        'pending_count': int((df['Payment Received'] == '-').sum()),
+        'by_status': breakdown(df['Recent Location']),
+        'by_destination': breakdown(df['Destination']),
+        'by_booking_week': breakdown(df['Booking Date'].dt.to_period('W').dt.start_time),
+    }
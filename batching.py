@@ -0,0 +1,37 @@
+import threading
+
+
+class AdaptiveBatcher:
+    def __init__(self, initial_size=50, min_size=5, max_size=250, target_latency=3.0, max_query_length=1800,
+                 step=10):
+        self.size = initial_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_latency = target_latency
+        self.max_query_length = max_query_length
+        self.step = step
+        self.lock = threading.Lock()
+
+    def take(self, track_numbers):
+        # Pops the next batch off the front of the track_numbers deque, keeping the comma-joined CNs under the URL limit.
+        with self.lock:
+            size = self.size
+
+        batch = []
+        query_length = 0
+        while track_numbers and len(batch) < size:
+            query_length += len(str(track_numbers[0])) + 1
+            if batch and query_length > self.max_query_length:
+                break
+            batch.append(track_numbers.popleft())
+
+        return batch
+
+    def record(self, batch_size, latency, succeeded):
+        with self.lock:
+            if not succeeded:
+                self.size = max(self.min_size, min(self.size, batch_size) // 2)
+            elif latency > self.target_latency * 1.5:
+                self.size = max(self.min_size, int(self.size * 0.75))
+            elif latency < self.target_latency and batch_size >= self.size:
+                self.size = min(self.max_size, self.size + self.step)
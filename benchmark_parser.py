@@ -0,0 +1,93 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+from utils import LOADSHEET_HEADERS, extract_data_from_html
+
+
+def extract_with_beautifulsoup(file_path):
+    # The parser extract_data_from_html used before the streaming one, kept here as the baseline.
+    from bs4 import BeautifulSoup
+
+    with open(file_path, 'r', encoding='utf-8') as file:
+        content = file.read()
+
+    soup = BeautifulSoup(content, 'html.parser')
+    rows = soup.find_all('tr')
+
+    data = []
+    for row in rows[1:]:
+        cells = row.find_all('td')
+        if len(cells) == 10:
+            if cells[0].text.strip() == "Sr.":
+                continue
+            data.append([cell.text.strip() for cell in cells])
+
+    return pd.DataFrame(data, columns=LOADSHEET_HEADERS)
+
+
+def write_sample_loadsheet(file_path, rows, seed=0):
+    generator = random.Random(seed)
+    cities = ['Karachi', 'Lahore', 'Islamabad', 'Faisalabad', 'Multan', 'Peshawar']
+
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write('<html><body><table><tr><td colspan="10">Load Sheet</td></tr>\n')
+        file.write('<tr>' + ''.join(f'<td>{header}</td>' for header in LOADSHEET_HEADERS) + '</tr>\n')
+        for index in range(1, rows + 1):
+            cells = [
+                index, f'KI{generator.randint(10 ** 9, 10 ** 10 - 1)}', generator.choice(cities), 'CaseDrip',
+                generator.randint(1, 3), f'Customer &amp; Co {index}', f'CD-{index}',
+                f'{generator.uniform(0.2, 3):.2f}', generator.randint(500, 9000), '',
+            ]
+            file.write('<tr>' + ''.join(f'<td> {cell} </td>' for cell in cells) + '</tr>\n')
+        file.write('</table></body></html>\n')
+
+
+def measure(function, file_path, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        df = function(file_path)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    function(file_path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return df, min(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the streaming loadsheet parser with the BeautifulSoup one.')
+    parser.add_argument('file', nargs='?', help='Loadsheet .html to parse; a synthetic one is generated if omitted')
+    parser.add_argument('--rows', type=int, default=20000, help='Rows in the generated loadsheet')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    file_path = args.file
+    if not file_path:
+        handle, file_path = tempfile.mkstemp(suffix='.html')
+        os.close(handle)
+        write_sample_loadsheet(file_path, args.rows)
+
+    try:
+        results = {}
+        for name, function in (('beautifulsoup', extract_with_beautifulsoup), ('streaming', extract_data_from_html)):
+            df, seconds, peak = measure(function, file_path, args.repeat)
+            results[name] = df
+            print(f"{name:>14}: {len(df)} rows, best of {args.repeat} {seconds:.3f} s, peak memory {peak / 2 ** 20:.1f} MB")
+
+        if results['beautifulsoup'].equals(results['streaming']):
+            print("Both parsers produced the same DataFrame.")
+        else:
+            print("The parsers produced different DataFrames.")
+    finally:
+        if not args.file:
+            os.remove(file_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import threading
+import time
+
+TERMINAL_TRACKING_STATUSES = {'delivered', 'returned to shipper'}
+TERMINAL_PAYMENT_STATUSES = {'paid'}
+
+# Seconds a cached tracking result stays fresh, keyed by booked packet status.
+TRACKING_TTLS = {
+    'pending': 6 * 3600,
+    'being return': 12 * 3600,
+    'ready for return': 12 * 3600,
+    'pickup request sent': 12 * 3600,
+}
+DEFAULT_TRACKING_TTL = 2 * 3600
+PAYMENT_TTL = 12 * 3600
+
+
+class TrackingCache:
+    def __init__(self, directory, file_name='tracking_cache.db'):
+        self.directory = directory
+        self.path = os.path.join(directory, file_name)
+        self.lock = threading.Lock()
+
+        try:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            with self.connection:
+                self.connection.execute(
+                    'CREATE TABLE IF NOT EXISTS tracking ('
+                    'cn TEXT PRIMARY KEY, booked_packet_status TEXT, recent_status TEXT, '
+                    'booking_date TEXT, fetched_at REAL)'
+                )
+                self.connection.execute(
+                    'CREATE TABLE IF NOT EXISTS payment ('
+                    'cn TEXT PRIMARY KEY, payment_status TEXT, payment_date TEXT, fetched_at REAL)'
+                )
+        except sqlite3.Error as e:
+            raise Exception(f"Error opening tracking cache: {e}")
+
+    def is_fresh(self, status, fetched_at, terminal_statuses, ttls, default_ttl, terminal_only=False):
+        status = (status or '').strip().lower()
+        if status in terminal_statuses:
+            return True
+        return not terminal_only and time.time() - fetched_at < ttls.get(status, default_ttl)
+
+    def select(self, table, columns, track_numbers):
+        rows = []
+        track_numbers = [str(track_number) for track_number in track_numbers]
+
+        with self.lock:
+            for start in range(0, len(track_numbers), 500):
+                chunk = track_numbers[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows.extend(self.connection.execute(
+                    f'SELECT cn, {columns}, fetched_at FROM {table} WHERE cn IN ({placeholders})', chunk
+                ).fetchall())
+
+        return rows
+
+    def get_tracking(self, track_numbers, terminal_only=False):
+        # terminal_only serves just the parcels that can no longer change, for callers that decide freshness themselves.
+        results = {}
+        for cn, booked_packet_status, recent_status, booking_date, fetched_at in self.select(
+                'tracking', 'booked_packet_status, recent_status, booking_date', track_numbers):
+            if self.is_fresh(booked_packet_status, fetched_at, TERMINAL_TRACKING_STATUSES, TRACKING_TTLS, DEFAULT_TRACKING_TTL,
+                             terminal_only):
+                results[cn] = (booked_packet_status, recent_status, booking_date)
+
+        return results
+
+    def put_tracking(self, results):
+        fetched_at = time.time()
+        rows = [
+            (str(cn), booked_packet_status, recent_status, booking_date, fetched_at)
+            for cn, (booked_packet_status, recent_status, booking_date) in results.items()
+            if booked_packet_status
+        ]
+
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO tracking VALUES (?, ?, ?, ?, ?)', rows)
+
+    def get_payments(self, track_numbers):
+        results = {}
+        for cn, payment_status, payment_date, fetched_at in self.select(
+                'payment', 'payment_status, payment_date', track_numbers):
+            if self.is_fresh(payment_status, fetched_at, TERMINAL_PAYMENT_STATUSES, {}, PAYMENT_TTL):
+                results[cn] = (payment_status, payment_date)
+
+        return results
+
+    def put_payments(self, results):
+        fetched_at = time.time()
+        rows = [
+            (str(cn), payment_status, payment_date, fetched_at)
+            for cn, (payment_status, payment_date) in results.items()
+            if payment_status
+        ]
+
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO payment VALUES (?, ?, ?, ?)', rows)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
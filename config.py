@@ -2,11 +2,19 @@ import json
 import os
 
 def save_config(api_key, api_password, directory):
-    config = {
+    config = {}
+    if os.path.exists('config.json'):
+        try:
+            with open('config.json', 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except Exception:
+            config = {}
+
+    config.update({
         'api_key': api_key,
         'api_password': api_password,
         'directory': directory
-    }
+    })
 
     try:
         with open('config.json', 'w', encoding='utf-8') as f:
@@ -33,3 +41,13 @@ def load_config():
             )
     except Exception as e:
         raise Exception(f"Error loading config: {e}")
+
+def load_setting(key, default=None):
+    if not os.path.exists('config.json'):
+        return default
+
+    try:
+        with open('config.json', 'r', encoding='utf-8') as f:
+            return json.load(f).get(key, default)
+    except Exception:
+        return default
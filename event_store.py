@@ -0,0 +1,101 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+ACTIVITY_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y']
+
+
+def parse_activity_time(event):
+    raw = event.get('Activity_datetime') or f"{event.get('Activity_Date', '')} {event.get('Activity_Time', '')}".strip()
+
+    for fmt in ACTIVITY_FORMATS:
+        try:
+            return datetime.strptime(raw, fmt).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            continue
+    return raw
+
+
+def date_bound(value, end=False):
+    if value is None:
+        return '9999' if end else ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    value = str(value)
+    return f'{value} 23:59:59' if end and len(value) == 10 else value
+
+
+class EventStore:
+    def __init__(self, directory, file_name='tracking_events.db'):
+        self.directory = directory
+        self.path = os.path.join(directory, file_name)
+        self.lock = threading.Lock()
+        self.status_ids = {}
+
+        try:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            with self.connection:
+                # Status names are stored once and referenced by id to keep event rows small.
+                self.connection.execute('CREATE TABLE IF NOT EXISTS statuses (id INTEGER PRIMARY KEY, name TEXT UNIQUE)')
+                self.connection.execute(
+                    'CREATE TABLE IF NOT EXISTS events ('
+                    'cn TEXT, activity_at TEXT, status_id INTEGER, reason TEXT, '
+                    'PRIMARY KEY (cn, activity_at, status_id)) WITHOUT ROWID'
+                )
+                self.connection.execute('CREATE INDEX IF NOT EXISTS events_by_status ON events (status_id, activity_at)')
+                self.connection.execute('CREATE INDEX IF NOT EXISTS events_by_date ON events (activity_at)')
+            self.status_ids = dict(self.connection.execute('SELECT name, id FROM statuses').fetchall())
+        except sqlite3.Error as e:
+            raise Exception(f"Error opening event store: {e}")
+
+    def status_id(self, name):
+        if name not in self.status_ids:
+            self.connection.execute('INSERT OR IGNORE INTO statuses (name) VALUES (?)', (name,))
+            self.status_ids[name] = self.connection.execute('SELECT id FROM statuses WHERE name = ?', (name,)).fetchone()[0]
+        return self.status_ids[name]
+
+    def append_packets(self, packet_list):
+        with self.lock, self.connection:
+            rows = []
+            for packet_info in packet_list:
+                cn = packet_info.get('track_number')
+                if not cn:
+                    continue
+
+                for event in packet_info.get('Tracking Detail') or []:
+                    status = event.get('Status')
+                    if status:
+                        rows.append((str(cn), parse_activity_time(event), self.status_id(status), event.get('Reason') or ''))
+
+            self.connection.executemany('INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?)', rows)
+
+    def query(self, where='', params=()):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT events.cn, statuses.name, events.activity_at, events.reason '
+                'FROM events JOIN statuses ON statuses.id = events.status_id '
+                f'{where} ORDER BY events.cn, events.activity_at', params
+            ).fetchall()
+
+    def events_for(self, cn):
+        return self.query('WHERE events.cn = ?', (str(cn),))
+
+    def events_with_status(self, status, start=None, end=None):
+        status_id = self.status_ids.get(status)
+        if status_id is None:
+            return []
+        return self.query(
+            'WHERE events.status_id = ? AND events.activity_at >= ? AND events.activity_at <= ?',
+            (status_id, date_bound(start), date_bound(end, end=True)),
+        )
+
+    def events_between(self, start, end):
+        return self.query(
+            'WHERE events.activity_at >= ? AND events.activity_at <= ?',
+            (date_bound(start), date_bound(end, end=True)),
+        )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
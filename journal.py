@@ -0,0 +1,57 @@
+import json
+import os
+
+
+def journal_mode(mode, batch=False):
+    # Batch runs hold only the parcels they added, so they keep a journal apart from full runs of the same mode.
+    return f'{mode}-batch' if batch else mode
+
+
+class RunJournal:
+    def __init__(self, final_file_path, mode):
+        self.path = f'{final_file_path}.{mode}.journal'
+        self.file = None
+
+    @staticmethod
+    def exists(final_file_path, mode):
+        return os.path.exists(f'{final_file_path}.{mode}.journal')
+
+    def entries(self):
+        if not os.path.exists(self.path):
+            return []
+
+        entries = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line may be cut short if the app died mid-write.
+                    break
+                entries.append((entry['cn'], entry['updates'], entry.get('kind')))
+        return entries
+
+    def open(self, resume=False):
+        try:
+            self.file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+        except Exception as e:
+            raise Exception(f"Error opening run journal: {e}")
+
+    def record(self, updates, kind=None):
+        for cn, values in updates:
+            entry = {'cn': cn, 'updates': values}
+            if kind:
+                entry['kind'] = kind
+            self.file.write(json.dumps(entry, default=str) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def finish(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,275 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+import pandas as pd
+from scheduler import parse_booking_date
+from xlsx_export import clean_value, write_rows
+
+# Sheet headers in final.xlsx order, mapped to their ledger columns.
+FINAL_COLUMNS = {
+    'CN #': 'cn',
+    'Recent Location': 'recent_location',
+    'Status': 'status',
+    'Destination': 'destination',
+    'Shipper Name': 'shipper_name',
+    'Consignee Name': 'consignee_name',
+    'Order Id': 'order_id',
+    'COD Amount': 'cod_amount',
+    'Booking Date': 'booking_date',
+    'Payment Received': 'payment_received',
+}
+
+# Export order: booking date, undated rows last, then arrival order.
+BOOKING_ORDER = 'booking_key IS NULL, booking_key, seq'
+
+# A parcel needs no more lookups once it is back with the shipper, or delivered and paid out.
+TERMINAL_PARCEL = (
+    "(LOWER(COALESCE(recent_location, '')) = 'returned to shipper' OR "
+    "(LOWER(COALESCE(recent_location, '')) = 'delivered' AND LOWER(COALESCE(payment_received, '')) LIKE 'paid%'))"
+)
+OPEN_PARCELS = 'month NOT IN (SELECT month FROM closed_months)'
+
+
+def booking_key(value):
+    booking_date = parse_booking_date(value) if clean_value(value) is not None else None
+    return booking_date.strftime('%Y-%m-%d') if booking_date else None
+
+
+def normalize_cn(value):
+    # Numeric CNs read back from a workbook can come out as floats (123.0); they must match the loadsheet's '123'.
+    value = clean_value(value)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip() if value is not None else None
+
+
+def partition_month(key):
+    # Parcels are partitioned by booking month; until tracking reports a booking date they sit in the ingest month.
+    return key[:7] if key else datetime.now().strftime('%Y-%m')
+
+
+def archive_path(final_file_path, month):
+    base, extension = os.path.splitext(final_file_path)
+    return f'{base}-{month}{extension}'
+
+
+class Ledger:
+    def __init__(self, directory, file_name='ledger.db'):
+        self.directory = directory
+        self.path = os.path.join(directory, file_name)
+        self.lock = threading.Lock()
+
+        try:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            columns = ', '.join(column for column in FINAL_COLUMNS.values() if column != 'cn')
+            with self.connection:
+                self.connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS parcels (seq INTEGER PRIMARY KEY AUTOINCREMENT, cn TEXT UNIQUE NOT NULL, '
+                    f'{columns}, booking_key TEXT, month TEXT)'
+                )
+                self.add_booking_key()
+                self.add_month()
+                self.connection.execute('CREATE INDEX IF NOT EXISTS parcels_booking ON parcels (booking_key, seq)')
+                self.connection.execute('CREATE INDEX IF NOT EXISTS parcels_month ON parcels (month)')
+                self.connection.execute('CREATE TABLE IF NOT EXISTS closed_months (month TEXT PRIMARY KEY, closed_at TEXT)')
+        except sqlite3.Error as e:
+            raise Exception(f"Error opening ledger: {e}")
+
+    def add_booking_key(self):
+        # Ledgers created before booking_key existed get the column and a one-off backfill.
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(parcels)')]
+        if 'booking_key' in columns:
+            return
+
+        self.connection.execute('ALTER TABLE parcels ADD COLUMN booking_key TEXT')
+        rows = self.connection.execute('SELECT seq, booking_date FROM parcels').fetchall()
+        self.connection.executemany(
+            'UPDATE parcels SET booking_key = ? WHERE seq = ?',
+            [(booking_key(booking_date), seq) for seq, booking_date in rows]
+        )
+
+    def add_month(self):
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(parcels)')]
+        if 'month' in columns:
+            return
+
+        self.connection.execute('ALTER TABLE parcels ADD COLUMN month TEXT')
+        rows = self.connection.execute('SELECT seq, booking_key FROM parcels').fetchall()
+        self.connection.executemany(
+            'UPDATE parcels SET month = ? WHERE seq = ?', [(partition_month(key), seq) for seq, key in rows]
+        )
+
+    def count(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM parcels').fetchone()[0]
+
+    def bootstrap(self, final_file_path):
+        # The first time a directory is used, the existing final.xlsx seeds the ledger.
+        # Older sheets were never de-duplicated, so repeated or blank CNs are skipped rather than failing the import.
+        if self.count() == 0 and os.path.exists(final_file_path):
+            df = pd.read_excel(final_file_path)
+            if 'CN #' in df.columns:
+                df = df[df['CN #'].map(normalize_cn).fillna('') != '']
+            self.append(df, ignore_duplicates=True)
+
+    def append(self, df, ignore_duplicates=False):
+        headers = [header for header in FINAL_COLUMNS if header in df.columns]
+        if 'CN #' not in headers:
+            raise Exception("The 'CN #' column is not found in the sheet.")
+
+        columns = [FINAL_COLUMNS[header] for header in headers] + ['booking_key', 'month']
+        rows = [
+            tuple(normalize_cn(value) if header == 'CN #' else clean_value(value) for header, value in zip(headers, row))
+            for row in df[headers].itertuples(index=False, name=None)
+        ]
+
+        # The parsed booking date is stored once on insert, so keeping the ledger ordered never re-parses dates.
+        if 'Booking Date' in headers:
+            position = headers.index('Booking Date')
+            rows = [row + (booking_key(row[position]),) for row in rows]
+        else:
+            rows = [row + (None,) for row in rows]
+        rows = [row + (partition_month(row[-1]),) for row in rows]
+
+        with self.lock, self.connection:
+            self.connection.executemany(
+                f'INSERT {"OR IGNORE " if ignore_duplicates else ""}INTO parcels ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})', rows
+            )
+        return len(rows)
+
+    def existing(self, cns):
+        cns = [normalize_cn(cn) for cn in cns]
+        found = set()
+
+        with self.lock:
+            for start in range(0, len(cns), 500):
+                chunk = cns[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                found.update(cn for cn, in self.connection.execute(
+                    f'SELECT cn FROM parcels WHERE cn IN ({placeholders})', chunk
+                ))
+        return found
+
+    def rows_for(self, cns, headers=None):
+        # Looks up just the given parcels through the CN index, in export order.
+        headers = headers or list(FINAL_COLUMNS)
+        columns = ', '.join(FINAL_COLUMNS[header] for header in headers)
+        cns = [normalize_cn(cn) for cn in cns]
+        rows = []
+
+        with self.lock:
+            for start in range(0, len(cns), 500):
+                chunk = cns[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows.extend(self.connection.execute(
+                    f'SELECT {columns}, booking_key IS NULL, booking_key, seq FROM parcels WHERE cn IN ({placeholders})', chunk
+                ))
+        rows.sort(key=lambda row: tuple('' if value is None else value for value in row[-3:]))
+        return pd.DataFrame([row[:-3] for row in rows], columns=headers)
+
+    def update_many(self, updates):
+        statements = {}
+        for cn, values in updates:
+            values = {header: value for header, value in values.items() if header in FINAL_COLUMNS and header != 'CN #'}
+            if not values:
+                continue
+            headers = tuple(sorted(values))
+            row = tuple(clean_value(values[header]) for header in headers)
+            if 'Booking Date' in values:
+                key = booking_key(values['Booking Date'])
+                row += (key, key[:7] if key else None)
+            statements.setdefault(headers, []).append(row + (str(cn),))
+
+        with self.lock, self.connection:
+            for headers, rows in statements.items():
+                assignments = ', '.join(f'{FINAL_COLUMNS[header]} = ?' for header in headers)
+                if 'Booking Date' in headers:
+                    assignments += ', booking_key = ?, month = COALESCE(?, month)'
+                self.connection.executemany(f'UPDATE parcels SET {assignments} WHERE cn = ?', rows)
+
+    def to_dataframe(self, headers=None, order_by=BOOKING_ORDER, months=None, open_only=False):
+        # Spans every partition unless narrowed to given booking months or to the open ones.
+        headers = headers or list(FINAL_COLUMNS)
+        columns = ', '.join(FINAL_COLUMNS[header] for header in headers)
+        conditions, parameters = self.partition_filter(months, open_only)
+
+        with self.lock:
+            rows = self.connection.execute(
+                f'SELECT {columns} FROM parcels {conditions} ORDER BY {order_by}', parameters
+            ).fetchall()
+        return pd.DataFrame(rows, columns=headers)
+
+    def partition_filter(self, months=None, open_only=False):
+        conditions = []
+        parameters = []
+        if months is not None:
+            months = list(months)
+            conditions.append(f'month IN ({",".join("?" * len(months))})')
+            parameters.extend(months)
+        if open_only:
+            conditions.append(OPEN_PARCELS)
+        return ('WHERE ' + ' AND '.join(conditions) if conditions else ''), parameters
+
+    def partitions(self):
+        with self.lock:
+            rows = self.connection.execute(
+                f'SELECT month, COUNT(*), SUM(NOT {TERMINAL_PARCEL}), month IN (SELECT month FROM closed_months) '
+                'FROM parcels GROUP BY month ORDER BY month'
+            ).fetchall()
+        return pd.DataFrame(
+            [(month, parcels, active or 0, bool(closed)) for month, parcels, active, closed in rows],
+            columns=['Month', 'Parcels', 'Active', 'Closed']
+        )
+
+    def refresh_partitions(self, final_file_path):
+        # Past months whose parcels are all terminal get one last archive workbook and drop out of final.xlsx for good.
+        # A closed month that gains an active parcel again (late booking date) is reopened.
+        current_month = partition_month(None)
+        closing = []
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                f'DELETE FROM closed_months WHERE month IN (SELECT month FROM parcels WHERE NOT {TERMINAL_PARCEL})'
+            )
+            rows = self.connection.execute(
+                f'SELECT month FROM parcels WHERE month < ? AND month NOT IN (SELECT month FROM closed_months) '
+                f'GROUP BY month HAVING SUM(NOT {TERMINAL_PARCEL}) = 0', (current_month,)
+            ).fetchall()
+            closing = [month for month, in rows]
+
+        for month in closing:
+            self.write_partition(archive_path(final_file_path, month), months=[month])
+            with self.lock, self.connection:
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO closed_months (month, closed_at) VALUES (?, ?)',
+                    (month, datetime.now().isoformat(timespec='seconds'))
+                )
+        return closing
+
+    def write_partition(self, file_path, months=None, open_only=False):
+        headers = list(FINAL_COLUMNS)
+        columns = ', '.join(FINAL_COLUMNS[header] for header in headers)
+        lengths = ', '.join(f'MAX(LENGTH({FINAL_COLUMNS[header]}))' for header in headers)
+        conditions, parameters = self.partition_filter(months, open_only)
+
+        # A separate connection reads one consistent snapshot without holding the lock for the whole write.
+        connection = sqlite3.connect(self.path)
+        try:
+            widths = connection.execute(f'SELECT {lengths} FROM parcels {conditions}', parameters).fetchone()
+            rows = connection.execute(f'SELECT {columns} FROM parcels {conditions} ORDER BY {BOOKING_ORDER}', parameters)
+            write_rows(file_path, headers, rows, lengths=widths, styled=True)
+        finally:
+            connection.close()
+
+    def export(self, final_file_path):
+        # final.xlsx holds only the open partitions; closed months live in their own archive workbooks.
+        try:
+            self.refresh_partitions(final_file_path)
+            self.write_partition(final_file_path, open_only=True)
+        except Exception as e:
+            raise Exception(f"Error exporting ledger: {e}")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -1,23 +1,163 @@
+import random
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from PyQt5.QtWidgets import QMessageBox
+from requests.adapters import HTTPAdapter
+from metrics import ApiMetrics
+from config import load_setting
+
+DEFAULT_BASE_URL = 'https://merchantapi.leopardscourier.com/'
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class ApiUnavailableError(Exception):
+    # Retries ran out on connection errors, timeouts or server errors, so the request itself was not at fault.
+    pass
+
+
+class RateLimiter:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def before_request(self):
+        with self.lock:
+            if self.opened_at and time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError("Leopard API is unavailable, requests are paused for a while.")
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+# Shared by every client so concurrent workers respect one request budget.
+shared_rate_limiter = RateLimiter(rate=float(load_setting("api_rate_limit", 5)), capacity=float(load_setting("api_burst", 10)))
+shared_circuit_breaker = CircuitBreaker()
+shared_metrics = ApiMetrics()
+
+clients = {}
+clients_lock = threading.Lock()
+
+
+def get_api_client(api_key, api_password, pool_size=10, base_url=None):
+    base_url = base_url or DEFAULT_BASE_URL
+
+    with clients_lock:
+        client = clients.get((api_key, api_password, base_url))
+
+        if client is None or client.pool_size != pool_size:
+            # A replaced client that a worker still holds is closed by that worker's release instead.
+            for stale_client in clients.values():
+                stale_client.retired = True
+                if stale_client.holders == 0:
+                    stale_client.close()
+            clients.clear()
+
+            client = LeopardCourierAPI(api_key, api_password, pool_size=pool_size, base_url=base_url)
+            clients[(api_key, api_password, base_url)] = client
+
+        return client
 
-def show_error_message(error_message):
-    msg = QMessageBox()
-    msg.setIcon(QMessageBox.Critical)
-    msg.setText(error_message)
-    msg.setWindowTitle("Error")
-    msg.exec_()
 
 class LeopardCourierAPI:
-    def __init__(self, api_key, api_password):
+    def __init__(self, api_key, api_password, cache=None, event_store=None, timeout=(5, 30), max_retries=3, backoff_factor=0.5,
+                 max_backoff=30, rate_limiter=None, circuit_breaker=None, pool_size=10,
+                 base_url=None, metrics=None):
         self.api_key = api_key
         self.api_password = api_password
-        self.track_endpoint = 'https://merchantapi.leopardscourier.com/api/trackBookedPacket/format/json/'
-        self.payment_endpoint = 'https://merchantapi.leopardscourier.com/api/getPaymentDetails/format/json/'
+        self.cache = cache
+        self.event_store = event_store
+        self.event_store_error_handler = None
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.rate_limiter = rate_limiter or shared_rate_limiter
+        self.circuit_breaker = circuit_breaker or shared_circuit_breaker
+        self.metrics = metrics or shared_metrics
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip('/') + '/'
+        self.track_endpoint = f'{self.base_url}api/trackBookedPacket/format/json/'
+        self.payment_endpoint = f'{self.base_url}api/getPaymentDetails/format/json/'
+        self.pool_size = pool_size
+        self.holders = 0
+        self.retired = False
         self.session = requests.Session()
         self.session.headers.update({'Content-Type': 'application/json'})
 
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def warm_up(self, connections=None):
+        def open_connection(_):
+            self.rate_limiter.acquire()
+            try:
+                self.session.head(self.base_url, timeout=self.timeout)
+            except requests.RequestException:
+                pass
+
+        connections = connections or self.pool_size
+        self.hold()
+        try:
+            with ThreadPoolExecutor(max_workers=connections) as executor:
+                list(executor.map(open_connection, range(connections)))
+        finally:
+            self.release()
+
+    def hold(self):
+        # Workers hold the client for their whole run, so replacing it in the registry does not close their session.
+        with clients_lock:
+            self.holders += 1
+
+    def release(self):
+        with clients_lock:
+            self.holders -= 1
+            close = self.retired and self.holders == 0
+        if close:
+            self.close()
+
+    def close(self):
+        self.session.close()
+
     def create_payload(self, identifier, is_tracking=True):
         return {
             'api_key': self.api_key,
@@ -26,35 +166,136 @@ class LeopardCourierAPI:
         }
 
 
-    def send_request(self, payload):
+    def backoff_delay(self, attempt, response=None):
+        if response is not None and response.status_code == 429:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return min(self.max_backoff, int(retry_after))
+
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** attempt))
+
+    def timed_get(self, url, endpoint_name, **kwargs):
+        started = time.monotonic()
         try:
-            response = self.session.get(self.track_endpoint, json=payload)
+            response = self.session.get(url, timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            self.metrics.record(endpoint_name, time.monotonic() - started, False)
+            raise
+
+        request = response.request
+        self.metrics.record(
+            endpoint_name,
+            time.monotonic() - started,
+            response.ok,
+            bytes_sent=len(request.url) + len(request.body or b''),
+            bytes_received=len(response.content),
+        )
+        return response
+
+    def request_with_retry(self, url, endpoint_name, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.circuit_breaker.before_request()
+            self.rate_limiter.acquire()
+
+            try:
+                response = self.timed_get(url, endpoint_name, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.circuit_breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise ApiUnavailableError(f"Leopard API could not be reached: {e}")
+                time.sleep(self.backoff_delay(attempt))
+                continue
+
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                self.circuit_breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise ApiUnavailableError(f"Leopard API responded with HTTP {response.status_code}")
+                time.sleep(self.backoff_delay(attempt, response))
+                continue
+
+            # Only a 2xx shows the API is healthy; a 4xx (bad credentials, rejected payload) neither resets nor trips the breaker.
+            if 200 <= response.status_code < 300:
+                self.circuit_breaker.record_success()
             response.raise_for_status()
+            return response
+
+    def send_request(self, payload):
+        try:
+            response = self.request_with_retry(self.track_endpoint, 'trackBookedPacket', json=payload)
             return response.json()
+        except CircuitOpenError:
+            raise
         except Exception as e:
-            show_error_message(f'Error occurred: {e}')
+            raise Exception(f'Error occurred while getting response: {e}')
     
-    def track_booked_packet(self, track_number):
+    def track_booked_packet(self, track_number, use_cache=True):
         try:
+            if use_cache and self.cache:
+                cached = self.cache.get_tracking([track_number])
+                if cached:
+                    return cached[str(track_number)]
+
             payload = self.create_payload(track_number, is_tracking=True)
             data = self.send_request(payload)
-            return self.parse_response(data)
+            result = self.parse_response(data)
+            self.record_events(data)
+
+            if use_cache and self.cache:
+                self.cache.put_tracking({track_number: result})
+            return result
+        except CircuitOpenError:
+            raise
         except Exception as e:
             raise Exception(f"Tracking packet failed: {e}")
         
+    def track_booked_packets(self, track_numbers, terminal_cache_only=False):
+        try:
+            results = self.cache.get_tracking(track_numbers, terminal_only=terminal_cache_only) if self.cache else {}
+            missing = [str(track_number) for track_number in track_numbers if str(track_number) not in results]
+
+            if missing:
+                payload = self.create_payload(','.join(missing), is_tracking=True)
+                data = self.send_request(payload)
+                fetched = self.parse_bulk_response(data)
+                self.record_events(data)
+
+                if self.cache:
+                    self.cache.put_tracking(fetched)
+                results.update(fetched)
+
+            return results
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            raise Exception(f"Tracking packets failed: {e}")
+
     def track_payment_status(self, cn_numbers_str):
         try:
-            payload = self.create_payload(cn_numbers_str, is_tracking=False)
-            data = self.send_payment_request(payload)
-            return self.parse_payment_response(data)
+            track_numbers = [cn for cn in cn_numbers_str.split(',') if cn]
+            results = self.cache.get_payments(track_numbers) if self.cache else {}
+            missing = [cn for cn in track_numbers if cn not in results]
+
+            if missing:
+                payload = self.create_payload(','.join(missing), is_tracking=False)
+                data = self.send_payment_request(payload)
+                fetched = self.parse_payment_response(data)
+
+                if self.cache:
+                    self.cache.put_payments(fetched)
+                results.update(fetched)
+
+            return results
+        except (CircuitOpenError, ApiUnavailableError):
+            raise
         except Exception as e:
             raise Exception(f"Error occurred: {e}")
 
     def send_payment_request(self, payload):
         try:
-            response = self.session.get(self.payment_endpoint, params=payload)
-            response.raise_for_status()
+            response = self.request_with_retry(self.payment_endpoint, 'getPaymentDetails', params=payload)
             return response.json()
+        except (CircuitOpenError, ApiUnavailableError):
+            raise
         except Exception as e:
             raise Exception(f'Error occurred while getting response: {e}')
 
@@ -71,28 +312,56 @@ class LeopardCourierAPI:
 
         return results
 
+    def record_events(self, data):
+        if self.event_store and data.get('status') == 1 and data.get('packet_list'):
+            try:
+                self.event_store.append_packets(data['packet_list'])
+            except Exception as e:
+                # The tracking result is still good, so the failure is reported without failing the request.
+                if self.event_store_error_handler:
+                    self.event_store_error_handler(f"Failed to store tracking events: {e}")
+
+    def parse_packet(self, packet_info):
+        booked_packet_status = packet_info['booked_packet_status']
+        booking_date = packet_info['booking_date']
+        tracking_details = packet_info.get('Tracking Detail', [])
+        recent_status = tracking_details[-1]['Status'] if tracking_details else None
+
+        return booked_packet_status, recent_status, booking_date
+
     def parse_response(self, data):
         try:
             if data['status'] == 1 and data['packet_list']:
-                packet_info = data['packet_list'][0]
-                booked_packet_status = packet_info['booked_packet_status']
-                booking_date = packet_info['booking_date']
-                tracking_details = packet_info.get('Tracking Detail', [])
-                recent_status = tracking_details[-1]['Status'] if tracking_details else None
-                
-                return booked_packet_status, recent_status, booking_date
+                return self.parse_packet(data['packet_list'][0])
             else:
                 return None, None, None
             
         except (KeyError, IndexError, ValueError) as e:
             raise Exception(f"Error parsing response: {e}")
 
+    def parse_bulk_response(self, data):
+        results = {}
+        try:
+            if data['status'] == 1 and data['packet_list']:
+                for packet_info in data['packet_list']:
+                    track_number = packet_info.get('track_number')
+
+                    if track_number:
+                        results[str(track_number)] = self.parse_packet(packet_info)
+
+            return results
+
+        except (KeyError, IndexError, ValueError) as e:
+            raise Exception(f"Error parsing response: {e}")
+
     def check_api_strength(self, track_number):
         try:
             start = datetime.now()
-            self.track_booked_packet(track_number)
+            self.track_booked_packet(track_number, use_cache=False)
             end = datetime.now()
             time_taken = (end - start).total_seconds()
             return time_taken
+        except CircuitOpenError:
+            raise
         except Exception as e:
             raise Exception(f"API strength check failed: {e}")
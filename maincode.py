@@ -5,19 +5,29 @@ from datetime import datetime
 from PyQt5.QtWidgets import (QApplication, QWidget, QPushButton, QLabel
                              , QFileDialog, QMessageBox, QLineEdit, 
                              QHBoxLayout, QProgressBar, QVBoxLayout, QGroupBox, QGridLayout)
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QDragEnterEvent, QDropEvent
 from analytics import AnalyticsTab
 from thread import WorkerThread
 import threading
 import pandas as pd
-from leopard import LeopardCourierAPI
-from config import load_config, save_config
-from utils import extract_data_from_html, rename_file_extension, delete_temporary_files, is_connected, open_excel_file
-from excel_operations import customize_excel, save_data_to_excel, add_columns, append_to_final, calculate_payments, sort_by_booking_date
+from leopard import get_api_client, shared_metrics
+from cache import TrackingCache
+from scheduler import PollScheduler
+from event_store import EventStore
+from journal import RunJournal
+from ledger import Ledger
+from watcher import FolderWatcher
+from config import load_config, save_config, load_setting
+from utils import is_loadsheet, extract_data_from_html, extract_data_from_html_files, rename_file_extension, delete_temporary_files, is_connected, open_excel_file
+from excel_operations import customize_excel, validate_loadsheet, ingest_loadsheet, describe_duplicates, calculate_payments
 
 
 class FileConverterApp(QWidget):
+    # The API strength check runs on a plain thread and reports through these, so only the GUI thread touches the label.
+    api_strength_measured = pyqtSignal(dict)
+    api_strength_unavailable = pyqtSignal(str)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("CaseDrip Leopard")
@@ -102,8 +112,18 @@ class FileConverterApp(QWidget):
         """)
 
         # Initialize variables
-        self.file_path = None
+        self.file_paths = []
         self.api_key, self.api_password, self.final_xlsx_directory = load_config()
+        self.tracking_concurrency = load_setting("tracking_concurrency", 8)
+        self.api_base_url = load_setting("api_base_url")
+        self.tracking_cache = None
+        self.poll_scheduler = None
+        self.event_store = None
+        self.ledger = None
+        self.worker_thread = None
+        self.folder_watcher = None
+        self.watch_queue = []
+        self.watch_run_problems = []
 
         # Main layout
         main_layout = QVBoxLayout(self)
@@ -126,9 +146,25 @@ class FileConverterApp(QWidget):
         self.track_button.clicked.connect(self.track_existing_parcels)
         self.directory_button.clicked.connect(self.select_directory)
         self.track_payment_button.clicked.connect(self.track_existing_payments)
+        self.track_all_button.clicked.connect(self.track_parcels_and_payments)
         self.show_analytics_button.clicked.connect(self.show_analytics)
         self.calculate_payments_button.clicked.connect(self.calculate_and_update_payments)
 
+        # Keep the API strength label in step with live request stats
+        self.api_strength_timer = QTimer(self)
+        self.api_strength_timer.timeout.connect(self.refresh_live_api_strength)
+        self.api_strength_timer.start(15000)
+        self.api_strength_measured.connect(self.show_api_strength)
+        self.api_strength_unavailable.connect(self.api_strength_label.setText)
+
+        # Open API connections in the background so the first job skips the handshakes
+        if self.api_key and self.api_password:
+            warm_up_thread = threading.Thread(target=self.create_api(self.api_key, self.api_password).warm_up)
+            warm_up_thread.daemon = True
+            warm_up_thread.start()
+
+        self.start_folder_watcher()
+
 
     def create_header_section(self):
         container = QWidget()
@@ -296,10 +332,12 @@ class FileConverterApp(QWidget):
         button_layout.setSpacing(15)
 
         self.track_payment_button = self.create_button("Track Payments", "💳")
+        self.track_all_button = self.create_button("Track All", "🔄")
         self.calculate_payments_button = self.create_button("Calculate Payments", "🧾")
         self.show_analytics_button = self.create_button("Show Analytics", "📊")
 
         button_layout.addWidget(self.track_payment_button)
+        button_layout.addWidget(self.track_all_button)
         button_layout.addWidget(self.calculate_payments_button)
         button_layout.addWidget(self.show_analytics_button)
 
@@ -342,6 +380,103 @@ class FileConverterApp(QWidget):
         group.setLayout(layout)
         return group
 
+    def create_api(self, api_key, api_password):
+        directory = self.final_xlsx_directory
+        if self.tracking_cache is None or self.tracking_cache.directory != directory:
+            self.tracking_cache = None
+            self.poll_scheduler = None
+            self.event_store = None
+            if directory and os.path.isdir(directory):
+                try:
+                    self.tracking_cache = TrackingCache(directory)
+                    self.poll_scheduler = PollScheduler(directory)
+                    self.event_store = EventStore(directory)
+                except Exception as e:
+                    self.status_label.setText(f"Tracking stores unavailable, running without the cache: {e}")
+
+        api = get_api_client(api_key, api_password, pool_size=self.tracking_concurrency, base_url=self.api_base_url)
+        api.cache = self.tracking_cache
+        api.event_store = self.event_store
+        return api
+
+    def get_ledger(self, final_file_path):
+        directory = os.path.dirname(final_file_path)
+        if self.ledger is None or self.ledger.directory != directory:
+            self.ledger = None
+            try:
+                self.ledger = Ledger(directory)
+                self.ledger.bootstrap(final_file_path)
+            except Exception as e:
+                self.status_label.setText(f"Ledger unavailable: {e}")
+                self.ledger = None
+        return self.ledger
+
+    def start_folder_watcher(self):
+        if self.folder_watcher:
+            self.folder_watcher.stop()
+            self.folder_watcher = None
+        self.watch_queue = []
+
+        if not self.final_xlsx_directory or not os.path.isdir(self.final_xlsx_directory) or not load_setting("watch_folder", True):
+            return
+
+        self.folder_watcher = FolderWatcher(self.final_xlsx_directory)
+        self.folder_watcher.loadsheets_ready.connect(self.loadsheets_detected)
+        self.folder_watcher.problem.connect(lambda message: self.status_label.setText(f"Watch folder: {message}"))
+        self.folder_watcher.start()
+
+    def loadsheets_detected(self, file_paths):
+        self.watch_queue.extend(file_path for file_path in file_paths if file_path not in self.watch_queue)
+        self.ingest_watched_loadsheets()
+
+    def ingest_watched_loadsheets(self):
+        # Loadsheets found by the folder watcher go through the normal convert flow, one batch at a time.
+        if self.worker_thread is not None or not self.watch_queue or not self.folder_watcher:
+            return
+
+        if not is_connected():
+            self.status_label.setText(f"{len(self.watch_queue)} loadsheet(s) waiting for a connection...")
+            QTimer.singleShot(30000, self.ingest_watched_loadsheets)
+            return
+
+        # Runs unattended: nothing here may open a dialog, so problems go to the status label instead.
+        file_paths, self.watch_queue = self.watch_queue, []
+        api = self.create_api(self.api_key_input.text(), self.api_password_input.text())
+        outcome = self.ingest_files(file_paths)
+
+        # Only loadsheets that made it into the ledger are recorded; the rest are offered again on the next scan.
+        try:
+            self.folder_watcher.mark_processed(outcome['ingested'])
+        except Exception as e:
+            outcome['problems'].append(str(e))
+        self.folder_watcher.release(file_paths)
+
+        messages = []
+        if outcome['track_numbers']:
+            self.start_batch_tracking(api, outcome, unattended=True)
+            messages.append(f"Tracking {len(outcome['track_numbers'])} new parcel(s) from the watch folder...")
+        if outcome['duplicates']:
+            messages.append(describe_duplicates(len(outcome['track_numbers']), outcome['duplicates']))
+        messages.extend(f"Watch folder: {problem}" for problem in outcome['problems'])
+        if messages:
+            self.status_label.setText(" ".join(messages))
+
+    def closeEvent(self, event):
+        if self.folder_watcher:
+            self.folder_watcher.stop()
+        super().closeEvent(event)
+
+    def ask_resume(self, final_file_path, mode):
+        if not RunJournal.exists(final_file_path, mode):
+            return False
+
+        answer = QMessageBox.question(
+            self, "Resume Run",
+            f"A previous {mode} run was interrupted. Resume it and skip the parcels it already processed?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes
+        )
+        return answer == QMessageBox.Yes
+
     def create_button(self, text, emoji):
         button = QPushButton(f"{emoji} {text}")
         button.setCursor(Qt.PointingHandCursor)
@@ -350,7 +485,7 @@ class FileConverterApp(QWidget):
     def dragEnterEvent(self, event: QDragEnterEvent):
         if event.mimeData().hasUrls():
             urls = event.mimeData().urls()
-            if len(urls) > 0 and urls[0].toLocalFile().endswith('.xls'):
+            if any(is_loadsheet(url.toLocalFile()) for url in urls):
                 event.acceptProposedAction()
             else:
                 event.ignore()
@@ -358,9 +493,15 @@ class FileConverterApp(QWidget):
             event.ignore()
 
     def dropEvent(self, event: QDropEvent):
-        dropped_file = event.mimeData().urls()[0].toLocalFile()
-        self.file_path = dropped_file
-        self.status_label.setText(f"Selected file: {os.path.basename(dropped_file)}")
+        dropped_files = [url.toLocalFile() for url in event.mimeData().urls() if is_loadsheet(url.toLocalFile())]
+        self.select_files(dropped_files)
+
+    def select_files(self, file_paths):
+        self.file_paths = list(file_paths)
+        if len(self.file_paths) == 1:
+            self.status_label.setText(f"Selected file: {os.path.basename(self.file_paths[0])}")
+        else:
+            self.status_label.setText(f"Selected {len(self.file_paths)} files")
         self.convert_button.setEnabled(True)
 
     def show_analytics(self):
@@ -385,7 +526,7 @@ class FileConverterApp(QWidget):
                 raise FileNotFoundError("The final.xlsx file could not be found.")
 
             # Proceed with payment calculation
-            total_cod_amount, pending_payment, delivered_pending = calculate_payments(file_path)
+            total_cod_amount, pending_payment, delivered_pending = calculate_payments(file_path, self.get_ledger(file_path))
 
             if total_cod_amount is None or pending_payment is None:
                 raise ValueError("Invalid payment values")
@@ -410,19 +551,15 @@ class FileConverterApp(QWidget):
         if self.final_xlsx_directory:
             options = QFileDialog.Options()
             options |= QFileDialog.DontUseNativeDialog
-            file_path, _ = QFileDialog.getOpenFileName(self, "Select an XLS file", self.final_xlsx_directory, "Excel Files (*.xls);;All Files (*)", options=options)
-            if file_path:
-                self.file_path = file_path
-                self.status_label.setText(f"Selected file: {os.path.basename(file_path)}")
-                self.convert_button.setEnabled(True)
+            file_paths, _ = QFileDialog.getOpenFileNames(self, "Select XLS files", self.final_xlsx_directory, "Excel Files (*.xls);;All Files (*)", options=options)
+            if file_paths:
+                self.select_files(file_paths)
         else:
             options = QFileDialog.Options()
             options |= QFileDialog.DontUseNativeDialog
-            file_path, _ = QFileDialog.getOpenFileName(self, "Select an XLS file", os.path.join(os.path.join(os.environ['USERPROFILE']), 'Desktop'), "Excel Files (*.xls);;All Files (*)", options=options)
-            if file_path:
-                self.file_path = file_path
-                self.status_label.setText(f"Selected file: {os.path.basename(file_path)}")
-                self.convert_button.setEnabled(True)
+            file_paths, _ = QFileDialog.getOpenFileNames(self, "Select XLS files", os.path.join(os.path.join(os.environ['USERPROFILE']), 'Desktop'), "Excel Files (*.xls);;All Files (*)", options=options)
+            if file_paths:
+                self.select_files(file_paths)
             else:
                 QMessageBox.warning(self, "Error", "Please select a file.")
 
@@ -432,71 +569,172 @@ class FileConverterApp(QWidget):
             QMessageBox.warning(self, "Network Error", "No internet connection. Please check your network and try again.")
             return
         
-        if self.file_path:
-            if not self.file_path.endswith('.xls'):
+        if self.file_paths:
+            if not all(is_loadsheet(file_path) for file_path in self.file_paths):
                 QMessageBox.warning(self, "Invalid File", "Please select an .xls file.")
                 return
             
             self.convert_button.setEnabled(False)
             self.track_button.setEnabled(False)
             self.track_payment_button.setEnabled(False)
+            self.track_all_button.setEnabled(False)
 
             api_key = self.api_key_input.text()
             api_password = self.api_password_input.text()
             save_config(api_key, api_password, self.final_xlsx_directory)
 
-            api = LeopardCourierAPI(api_key, api_password)
-            result_message, html_file_path = rename_file_extension(self.file_path)
+            api = self.create_api(api_key, api_password)
+            file_paths, self.file_paths = self.file_paths, []
+            outcome = self.ingest_files(file_paths)
 
-            self.file_path = None
+            if outcome['problems']:
+                QMessageBox.warning(self, "Error", "\n".join(outcome['problems']))
+            if outcome['duplicates']:
+                QMessageBox.information(self, "Duplicates Skipped", describe_duplicates(len(outcome['track_numbers']), outcome['duplicates']))
+            if outcome['track_numbers']:
+                self.start_batch_tracking(api, outcome)
 
+            self.status_label.setText("Drag and drop a file or click 'Upload'")
+            self.convert_button.setEnabled(False)
+        else:
+            QMessageBox.warning(self, "No File", "Please upload a file first.")
+
+    def ingest_files(self, file_paths):
+        # Renames, parses and adds a batch of loadsheets to the ledger without any dialogs, so the folder watcher can
+        # run it unattended; problems are collected for the caller to report.
+        outcome = {'final_file_path': None, 'ledger': None, 'track_numbers': [], 'duplicates': [], 'ingested': [], 'problems': []}
+
+        directory = self.final_xlsx_directory or os.path.dirname(file_paths[0])
+        final_file_path = os.path.join(directory, 'final.xlsx')
+        ledger = self.get_ledger(final_file_path)
+        if not ledger:
+            # Nothing has been renamed yet, so the loadsheets can be retried as they are.
+            outcome['problems'].append("The parcel ledger could not be opened.")
+            return outcome
+        outcome['final_file_path'], outcome['ledger'] = final_file_path, ledger
+
+        html_file_paths = {}
+        for file_path in file_paths:
+            result_message, html_file_path = rename_file_extension(file_path)
             if html_file_path:
+                html_file_paths[html_file_path] = file_path
+            elif result_message:
+                outcome['problems'].append(result_message)
+        if not html_file_paths:
+            return outcome
+
+        # A batch of loadsheets is parsed in parallel processes and merged, so it lands in one ledger write
+        if len(html_file_paths) == 1:
+            html_file_path = next(iter(html_file_paths))
+            try:
+                results = [(html_file_path, extract_data_from_html(html_file_path), None)]
+            except Exception as e:
+                results = [(html_file_path, None, e)]
+        else:
+            self.status_label.setText(f"Reading {len(html_file_paths)} loadsheets...")
+            QApplication.processEvents()
+            results = extract_data_from_html_files(list(html_file_paths))
+
+        for html_file_path, _, error in results:
+            if error:
+                outcome['problems'].append(f"Could not read {os.path.basename(html_file_path)}: {error}")
+
+        # Invalid loadsheets (Zone column, nothing new) are dropped on their own before the merge.
+        parsed = []
+        for html_file_path, df, error in results:
+            if error:
+                continue
+            try:
+                validate_loadsheet(df, ledger)
+                parsed.append((html_file_path, df))
+            except Exception as e:
+                outcome['problems'].append(f"{os.path.basename(html_file_paths[html_file_path])}: {e}")
+                delete_temporary_files(html_file_path)
+        if not parsed:
+            return outcome
+
+        # The loadsheet goes straight into the ledger; the tracking run writes final.xlsx once, styled, at the end.
+        try:
+            outcome['track_numbers'], outcome['duplicates'] = ingest_loadsheet(pd.concat([df for _, df in parsed], ignore_index=True), ledger)
+            outcome['ingested'] = [html_file_paths[html_file_path] for html_file_path, _ in parsed]
+        except Exception as e:
+            # These loadsheets were valid, so they get their names back to be tried again.
+            outcome['problems'].append(f"Error appending to final sheet: {e}")
+            for html_file_path, _ in parsed:
                 try:
-                    df = extract_data_from_html(html_file_path)
-                except Exception as e:
-                    print(f"Error occurred: {e}")
-                    return
+                    os.replace(html_file_path, html_file_paths[html_file_path])
+                except OSError:
+                    pass
+        return outcome
+
+    def start_batch_tracking(self, api, outcome, unattended=False):
+        # A batch only tracks the parcels it added, in a single pass. It always picks up an interrupted batch's journal:
+        # its own parcels are new, and the earlier batch's entries are written to the ledger.
+        self.worker_thread = WorkerThread(api, outcome['final_file_path'], mode= "tracking", concurrency=self.tracking_concurrency, scheduler=self.poll_scheduler,
+                                          resume=True, ledger=outcome['ledger'], from_ledger=True,
+                                          track_numbers=outcome['track_numbers'])
+
+        self.worker_thread.progress.connect(self.update_progress)
+        self.worker_thread.result.connect(self.tracking_completed)
+        # Runs the watcher started report errors in the status label; nobody may be there to close a dialog.
+        self.worker_thread.error.connect(self.watched_run_failed if unattended else self.tracking_failed)
+        self.worker_thread.finished.connect(self.cleanup_thread)
 
-                directory = os.path.dirname(html_file_path)
-                output_file_path = os.path.join(directory, 'temporary.xlsx')
+        self.convert_button.setEnabled(False)
+        self.track_button.setEnabled(False)
+        self.track_payment_button.setEnabled(False)
+        self.track_all_button.setEnabled(False)
 
-                try:
-                    save_data_to_excel(df, output_file_path)
-                except Exception as e:
-                    print(f"Error occurred: {e}")
-                    return
+        self.worker_thread.start()
 
-                if self.final_xlsx_directory:
-                    final_file_path = os.path.join(self.final_xlsx_directory, 'final.xlsx')
-                else:
-                    final_file_path = os.path.join(directory, 'final.xlsx')
+        self.status_label.setText("Tracking packets in progress...")
 
-                if append_to_final(output_file_path, final_file_path):
-                    add_columns(final_file_path)
-                    sort_by_booking_date(final_file_path)
-                    self.worker_thread = WorkerThread(api, final_file_path, mode= "tracking")
+    def track_existing_payments(self):
+        if not is_connected():
+            QMessageBox.warning(self, "Network Error", "No internet connection. Please check your network and try again.")
+            return
 
-                    self.worker_thread.progress.connect(self.update_progress)
-                    self.worker_thread.result.connect(self.tracking_completed)
-                    self.worker_thread.error.connect(self.tracking_failed)
-                    self.worker_thread.finished.connect(self.cleanup_thread)
+        try:
+            api_key = self.api_key_input.text()
+            api_password = self.api_password_input.text()
 
-                    self.worker_thread.start()
+            save_config(api_key, api_password, self.final_xlsx_directory)
 
-                    self.status_label.setText("Tracking packets in progress...")
+            api = self.create_api(api_key, api_password)
 
+            if not self.final_xlsx_directory:
+                QMessageBox.warning(self, "Error", "Please select a directory first.")
+                return
 
-                else:
-                    delete_temporary_files(html_file_path, output_file_path)
-            else:
-                QMessageBox.warning(self, "Error", result_message)
+            final_file_path = os.path.join(self.final_xlsx_directory, 'final.xlsx')
+            if not os.path.exists(final_file_path):
+                QMessageBox.warning(self, "Error", "The file 'final.xlsx' does not exist in the selected directory.")
+                return
 
-            self.status_label.setText("Drag and drop a file or click 'Upload'")
+            # Initialize WorkerThread
+            self.worker_thread = WorkerThread(api, final_file_path, mode="payment", concurrency=self.tracking_concurrency,
+                                              resume=self.ask_resume(final_file_path, "payment"), ledger=self.get_ledger(final_file_path))
+
+            # Connect signals
+            self.worker_thread.progress.connect(self.update_progress)
+            self.worker_thread.result.connect(self.tracking_completed)
+            self.worker_thread.error.connect(self.tracking_failed)
+            self.worker_thread.finished.connect(self.cleanup_thread)
+
+            # Disable UI elements during tracking
+            self.track_payment_button.setEnabled(False)
+            self.track_all_button.setEnabled(False)
+            self.track_button.setEnabled(False)
             self.convert_button.setEnabled(False)
-        else:
-            QMessageBox.warning(self, "No File", "Please upload a file first.")
 
-    def track_existing_payments(self):
+            # Start the worker thread
+            self.worker_thread.start()
+            self.status_label.setText("Tracking payments in progress...")
+
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"An unexpected error occurred: {e}")
+
+    def track_existing_parcels(self):
         if not is_connected():
             QMessageBox.warning(self, "Network Error", "No internet connection. Please check your network and try again.")
             return
@@ -507,7 +745,7 @@ class FileConverterApp(QWidget):
 
             save_config(api_key, api_password, self.final_xlsx_directory)
 
-            api = LeopardCourierAPI(api_key, api_password)
+            api = self.create_api(api_key, api_password)
 
             if not self.final_xlsx_directory:
                 QMessageBox.warning(self, "Error", "Please select a directory first.")
@@ -519,7 +757,8 @@ class FileConverterApp(QWidget):
                 return
 
             # Initialize WorkerThread
-            self.worker_thread = WorkerThread(api, final_file_path, mode="payment")
+            self.worker_thread = WorkerThread(api, final_file_path, mode="tracking", concurrency=self.tracking_concurrency, scheduler=self.poll_scheduler,
+                                              resume=self.ask_resume(final_file_path, "tracking"), ledger=self.get_ledger(final_file_path))
 
             # Connect signals
             self.worker_thread.progress.connect(self.update_progress)
@@ -528,18 +767,19 @@ class FileConverterApp(QWidget):
             self.worker_thread.finished.connect(self.cleanup_thread)
 
             # Disable UI elements during tracking
+            self.convert_button.setEnabled(False)
             self.track_payment_button.setEnabled(False)
+            self.track_all_button.setEnabled(False)
             self.track_button.setEnabled(False)
-            self.convert_button.setEnabled(False)
 
             # Start the worker thread
             self.worker_thread.start()
-            self.status_label.setText("Tracking payments in progress...")
+            self.status_label.setText("Tracking existing parcels in progress...")
 
         except Exception as e:
             QMessageBox.critical(self, "Error", f"An unexpected error occurred: {e}")
 
-    def track_existing_parcels(self):
+    def track_parcels_and_payments(self):
         if not is_connected():
             QMessageBox.warning(self, "Network Error", "No internet connection. Please check your network and try again.")
             return
@@ -550,7 +790,7 @@ class FileConverterApp(QWidget):
 
             save_config(api_key, api_password, self.final_xlsx_directory)
 
-            api = LeopardCourierAPI(api_key, api_password)
+            api = self.create_api(api_key, api_password)
 
             if not self.final_xlsx_directory:
                 QMessageBox.warning(self, "Error", "Please select a directory first.")
@@ -561,8 +801,9 @@ class FileConverterApp(QWidget):
                 QMessageBox.warning(self, "Error", "The file 'final.xlsx' does not exist in the selected directory.")
                 return
 
-            # Initialize WorkerThread
-            self.worker_thread = WorkerThread(api, final_file_path, mode="tracking")
+            # Tracking and payment lookups share one pass over the workbook
+            self.worker_thread = WorkerThread(api, final_file_path, mode="sync", concurrency=self.tracking_concurrency, scheduler=self.poll_scheduler,
+                                              resume=self.ask_resume(final_file_path, "sync"), ledger=self.get_ledger(final_file_path))
 
             # Connect signals
             self.worker_thread.progress.connect(self.update_progress)
@@ -573,11 +814,12 @@ class FileConverterApp(QWidget):
             # Disable UI elements during tracking
             self.convert_button.setEnabled(False)
             self.track_payment_button.setEnabled(False)
+            self.track_all_button.setEnabled(False)
             self.track_button.setEnabled(False)
 
             # Start the worker thread
             self.worker_thread.start()
-            self.status_label.setText("Tracking existing parcels in progress...")
+            self.status_label.setText("Tracking parcels and payments in progress...")
 
         except Exception as e:
             QMessageBox.critical(self, "Error", f"An unexpected error occurred: {e}")
@@ -589,28 +831,22 @@ class FileConverterApp(QWidget):
             self.setAcceptDrops(True)
 
     def tracking_completed(self):
-        self.convert_button.setEnabled(False if not self.file_path else True)
-        self.track_button.setEnabled(True)
-        self.track_payment_button.setEnabled(True)
-        self.upload_button.setText("📄 Upload LoadSheet")  # Reset text with icon
-        self.upload_button.setEnabled(True)
-        self.setAcceptDrops(True)
-
+        # The buttons come back in cleanup_thread, once the worker has actually finished.
         # Post-processing on Excel (optional)
+        worker = self.sender()
         if self.final_xlsx_directory:
             try:
-                customize_excel(self, self.final_xlsx_directory)
+                customize_excel(self, self.final_xlsx_directory, from_ledger=getattr(worker, "from_ledger", False))
             except Exception as e:
                 QMessageBox.warning(self, "Error", f"Failed to customize Excel: {e}")
 
     def tracking_failed(self):
+        # Errors can arrive while the run carries on, so the buttons stay disabled until cleanup_thread.
         QMessageBox.warning(self, "Error", "An error occurred while tracking parcels.")
-        self.convert_button.setEnabled(False if not self.file_path else True)
-        self.track_button.setEnabled(True)
-        self.track_payment_button.setEnabled(True)
-        self.upload_button.setText("📄 Upload LoadSheet")  # Reset text with icon
-        self.upload_button.setEnabled(True)
-        self.setAcceptDrops(True)
+
+    def watched_run_failed(self, message):
+        self.watch_run_problems.append(message)
+        self.status_label.setText(f"Watch folder: {message}")
 
 
     def cleanup_thread(self):
@@ -619,13 +855,20 @@ class FileConverterApp(QWidget):
             self.worker_thread = None
 
         # Re-enable UI elements
-        self.convert_button.setEnabled(False if not self.file_path else True)
+        self.convert_button.setEnabled(False if not self.file_paths else True)
         self.track_button.setEnabled(True)
         self.track_payment_button.setEnabled(True)
+        self.track_all_button.setEnabled(True)
         self.upload_button.setText("📄 Upload LoadSheet")  # Reset text with icon
         self.upload_button.setEnabled(True)
         self.setAcceptDrops(True)
         self.status_label.setText("Ready for the next operation.")
+        if self.watch_run_problems:
+            self.status_label.setText(f"Watch folder run finished with {len(self.watch_run_problems)} problem(s): {self.watch_run_problems[-1]}")
+            self.watch_run_problems = []
+        self.export_api_metrics()
+
+        self.ingest_watched_loadsheets()
 
 
     def select_directory(self):
@@ -638,6 +881,7 @@ class FileConverterApp(QWidget):
             self.directory_label.setText(f"📂 Selected Directory: {directory}")
             # Save the new directory to the configuration
             save_config(self.api_key_input.text(), self.api_password_input.text(), directory)
+            self.start_folder_watcher()
         else:
             QMessageBox.warning(self, "Error", "Please select a directory.")
 
@@ -648,12 +892,42 @@ class FileConverterApp(QWidget):
         file_path = os.path.normpath(file_path)
         open_excel_file(file_path)
     
+    def show_api_strength(self, stats):
+        if stats['error_rate'] > 0.25 or stats['p50'] > 8:
+            classification = "Bad 🟥📶"
+        elif stats['p50'] > 5:
+            classification = "Medium 🟧📶"
+        elif stats['p50'] > 1.5:
+            classification = "Good 🟨📶"
+        else:
+            classification = "Excellent 🟩📶"
+
+        self.api_strength_label.setText(f"API: {classification} ({stats['p50']:.2f}s, p95 {stats['p95']:.2f}s)")
+
+    def refresh_live_api_strength(self):
+        stats = shared_metrics.rolling()
+        if stats:
+            self.show_api_strength(stats)
+
+    def export_api_metrics(self):
+        if self.final_xlsx_directory and os.path.isdir(self.final_xlsx_directory):
+            try:
+                shared_metrics.export(os.path.join(self.final_xlsx_directory, 'api_metrics.jsonl'))
+            except Exception as e:
+                self.status_label.setText(f"Could not save API metrics: {e}")
+
     def update_api_strength(self):
+        # Live request stats are preferred; the probe below only runs when the API has been idle
+        stats = shared_metrics.rolling()
+        if stats:
+            self.show_api_strength(stats)
+            return
+
         def check_api_strength():
             try:
                 # Ensure API credentials are configured
                 if not self.api_key or not self.api_password:
-                    self.api_strength_label.setText("❌ API Not Configured")
+                    self.api_strength_unavailable.emit("❌ API Not Configured")
                     return
 
                 # Locate final.xlsx file and extract the last tracking number
@@ -661,49 +935,39 @@ class FileConverterApp(QWidget):
                     os.path.join(os.environ['USERPROFILE'], 'Desktop', 'final.xlsx')
 
                 if not os.path.exists(final_file_path):
-                    self.api_strength_label.setText("❌ final.xlsx Not Found")
+                    self.api_strength_unavailable.emit("❌ final.xlsx Not Found")
                     return
 
                 try:
                     df = pd.read_excel(final_file_path)
                     if 'CN #' not in df.columns or df.empty:
-                        self.api_strength_label.setText("❌ No Tracking Data Available")
+                        self.api_strength_unavailable.emit("❌ No Tracking Data Available")
                         return
                     last_tracking_number = df['CN #'].dropna().iloc[-1]
                 except Exception:
-                    self.api_strength_label.setText("❌ Error Reading final.xlsx")
+                    self.api_strength_unavailable.emit("❌ Error Reading final.xlsx")
                     return
 
                 # API instance
-                api = LeopardCourierAPI(self.api_key, self.api_password)
-
-                # Measure response time (3 attempts, calculate average)
-                total_time = 0
-                attempts = 2
-                for _ in range(attempts):
-                    try:
-                        total_time += api.check_api_strength(last_tracking_number)
-                    except Exception:
-                        total_time += 15  # Assign max timeout for unresponsive API
-
-                avg_response_time = total_time / attempts
-                avg_response_time += 2;
-
-                # Determine speed classification
-                if avg_response_time > 10:
-                    classification = "Bad 🟥📶"
-                elif avg_response_time > 7:
-                    classification = "Medium 🟧📶"
-                elif avg_response_time > 3:
-                    classification = "Good 🟨📶"
-                else:
-                    classification = "Excellent 🟩📶"
+                api = get_api_client(self.api_key, self.api_password, pool_size=self.tracking_concurrency, base_url=self.api_base_url)
 
-                # Update the label
-                self.api_strength_label.setText(f"API: {classification} ({avg_response_time:.2f}s)")
+                # No recent traffic to judge by, so send one probe; its timing lands in the shared metrics
+                api.hold()
+                try:
+                    api.check_api_strength(last_tracking_number)
+                except Exception:
+                    pass
+                finally:
+                    api.release()
+
+                stats = api.metrics.rolling()
+                if stats:
+                    self.api_strength_measured.emit(stats)
+                else:
+                    self.api_strength_unavailable.emit("❌ API Check Failed")
 
             except Exception:
-                self.api_strength_label.setText("❌ API Check Failed")
+                self.api_strength_unavailable.emit("❌ API Check Failed")
 
         # Run the API strength check in a separate thread to prevent blocking the UI
         thread = threading.Thread(target=check_api_strength)
@@ -718,5 +982,5 @@ def main():
     window.show()
     sys.exit(app.exec_())
 
-if __name__:
+if __name__ == '__main__':
     main()
@@ -0,0 +1,100 @@
+import bisect
+import json
+import threading
+import time
+from collections import deque
+
+# Upper bounds in seconds of the latency histogram buckets; the last bucket is open-ended.
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 7.5, 10, 15, 30, 60]
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += 1
+
+    def percentile(self, fraction):
+        if not self.total:
+            return None
+
+        threshold = fraction * self.total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= threshold:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+        return LATENCY_BUCKETS[-1]
+
+
+class EndpointStats:
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.requests = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def snapshot(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'p50': self.histogram.percentile(0.5),
+            'p95': self.histogram.percentile(0.95),
+            'p99': self.histogram.percentile(0.99),
+        }
+
+
+class ApiMetrics:
+    def __init__(self, window=300):
+        self.window = window
+        self.endpoints = {}
+        self.recent = deque()
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, seconds, succeeded, bytes_sent=0, bytes_received=0):
+        now = time.time()
+        with self.lock:
+            stats = self.endpoints.setdefault(endpoint, EndpointStats())
+            stats.histogram.add(seconds)
+            stats.requests += 1
+            stats.errors += 0 if succeeded else 1
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+
+            self.recent.append((now, seconds, succeeded))
+            while self.recent and self.recent[0][0] < now - self.window:
+                self.recent.popleft()
+
+    def rolling(self):
+        with self.lock:
+            cutoff = time.time() - self.window
+            samples = [(seconds, succeeded) for recorded_at, seconds, succeeded in self.recent if recorded_at >= cutoff]
+
+        if not samples:
+            return None
+
+        latencies = sorted(seconds for seconds, _ in samples)
+        return {
+            'requests': len(samples),
+            'error_rate': sum(1 for _, succeeded in samples if not succeeded) / len(samples),
+            'p50': latencies[len(latencies) // 2],
+            'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        }
+
+    def snapshot(self):
+        with self.lock:
+            return {endpoint: stats.snapshot() for endpoint, stats in self.endpoints.items()}
+
+    def export(self, file_path):
+        record = {'recorded_at': time.strftime('%Y-%m-%d %H:%M:%S'), 'endpoints': self.snapshot(), 'rolling': self.rolling()}
+        try:
+            with open(file_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+        except Exception as e:
+            raise Exception(f"Error exporting API metrics: {e}")
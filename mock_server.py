@@ -0,0 +1,212 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+TRACK_PATH = '/api/trackBookedPacket/format/json/'
+PAYMENT_PATH = '/api/getPaymentDetails/format/json/'
+
+IN_TRANSIT_STEPS = ['Pickup Request not Send', 'Arrived at Station', 'Dispatched', 'Assign to Courier']
+RETURN_STEPS = ['Ready for Return', 'Being Return', 'Returned to shipper']
+
+
+class MockSettings:
+    def __init__(self, latency=0.3, latency_distribution='lognormal', latency_spread=0.5, error_rate=0.0,
+                 rate_limit=0, return_rate=0.15, max_age_days=20, seed=0):
+        self.latency = latency
+        self.latency_distribution = latency_distribution
+        self.latency_spread = latency_spread
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.return_rate = return_rate
+        self.max_age_days = max_age_days
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.started_at = datetime.now().replace(microsecond=0)
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+
+    def sample_latency(self):
+        with self.lock:
+            if self.latency_distribution == 'fixed':
+                return self.latency
+            if self.latency_distribution == 'uniform':
+                return self.random.uniform(max(0, self.latency - self.latency_spread), self.latency + self.latency_spread)
+            return self.random.lognormvariate(0, self.latency_spread) * self.latency
+
+    def should_fail(self):
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def allow_request(self):
+        if not self.rate_limit:
+            return True
+
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            return self.window_count <= self.rate_limit
+
+
+def packet_history(cn, settings, now=None):
+    now = now or datetime.now()
+    digest = hashlib.sha256(f'{settings.seed}:{cn}'.encode()).hexdigest()
+    rng = random.Random(int(digest[:16], 16))
+
+    # Anchor histories to the server start so repeated polls return identical events.
+    booked_at = settings.started_at - timedelta(seconds=int(rng.uniform(0, settings.max_age_days) * 86400))
+    steps = IN_TRANSIT_STEPS + (RETURN_STEPS if rng.random() < settings.return_rate else ['Delivered'])
+
+    events = []
+    event_time = booked_at
+    for step in steps:
+        if event_time > now:
+            break
+        events.append({
+            'Status': step,
+            'Activity_Date': event_time.strftime('%Y-%m-%d'),
+            'Activity_Time': event_time.strftime('%H:%M:%S'),
+            'Reason': '',
+        })
+        event_time += timedelta(hours=rng.uniform(6, 48))
+
+    last_status = events[-1]['Status']
+    if last_status in ('Delivered', 'Returned to shipper', 'Being Return', 'Ready for Return'):
+        booked_packet_status = last_status
+    else:
+        booked_packet_status = 'Pending'
+
+    return {
+        'track_number': cn,
+        'booked_packet_status': booked_packet_status,
+        'booking_date': booked_at.strftime('%d/%m/%Y'),
+        'Tracking Detail': events,
+    }
+
+
+def payment_info(cn, settings, now=None):
+    now = now or datetime.now()
+    packet = packet_history(cn, settings, now)
+    if packet['booked_packet_status'] != 'Delivered':
+        return {'booked_packet_cn': cn, 'status': 'Pending', 'invoice_cheque_date': ''}
+
+    delivered_at = datetime.strptime(packet['Tracking Detail'][-1]['Activity_Date'], '%Y-%m-%d')
+    paid_at = delivered_at + timedelta(days=3)
+    if paid_at > now:
+        return {'booked_packet_cn': cn, 'status': 'Pending', 'invoice_cheque_date': ''}
+
+    return {'booked_packet_cn': cn, 'status': 'Paid', 'invoice_cheque_date': paid_at.strftime('%Y-%m-%d')}
+
+
+class MockLeopardHandler(BaseHTTPRequestHandler):
+    settings = MockSettings()
+
+    def read_payload(self):
+        payload = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            try:
+                payload.update(json.loads(self.rfile.read(length)))
+            except ValueError:
+                pass
+
+        return payload
+
+    def send_json(self, status_code, body, headers=None):
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.end_headers()
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path not in (TRACK_PATH, PAYMENT_PATH):
+            self.send_json(404, {'status': 0, 'error': 'Not found'})
+            return
+
+        if not self.settings.allow_request():
+            self.send_json(429, {'status': 0, 'error': 'Too many requests'}, {'Retry-After': '1'})
+            return
+
+        time.sleep(self.settings.sample_latency())
+
+        if self.settings.should_fail():
+            self.send_json(503, {'status': 0, 'error': 'Service unavailable'})
+            return
+
+        payload = self.read_payload()
+        if not payload.get('api_key') or not payload.get('api_password'):
+            self.send_json(200, {'status': 0, 'error': 'Invalid API credentials'})
+            return
+
+        if path == TRACK_PATH:
+            cns = [cn.strip() for cn in str(payload.get('track_numbers', '')).split(',') if cn.strip()]
+            self.send_json(200, {'status': 1, 'error': 0, 'packet_list': [packet_history(cn, self.settings) for cn in cns]})
+        else:
+            cns = [cn.strip() for cn in str(payload.get('cn_numbers', '')).split(',') if cn.strip()]
+            self.send_json(200, {'status': 1, 'error': 0, 'payment_list': [payment_info(cn, self.settings) for cn in cns]})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_server(host='127.0.0.1', port=8765, settings=None):
+    handler = type('ConfiguredMockLeopardHandler', (MockLeopardHandler,), {'settings': settings or MockSettings()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Leopard merchant API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.3, help='Typical response time in seconds')
+    parser.add_argument('--latency-distribution', choices=['fixed', 'uniform', 'lognormal'], default='lognormal')
+    parser.add_argument('--latency-spread', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--rate-limit', type=int, default=0, help='Requests per second before 429, 0 for unlimited')
+    parser.add_argument('--return-rate', type=float, default=0.15, help='Fraction of parcels that end up returned')
+    parser.add_argument('--max-age-days', type=float, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    settings = MockSettings(
+        latency=args.latency,
+        latency_distribution=args.latency_distribution,
+        latency_spread=args.latency_spread,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        return_rate=args.return_rate,
+        max_age_days=args.max_age_days,
+        seed=args.seed,
+    )
+    server = create_server(args.host, args.port, settings)
+    print(f"Mock Leopard API listening on http://{args.host}:{args.port}/")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import queue
+import threading
+
+DONE = object()
+
+
+class Pipeline:
+    def __init__(self, fetch, workers=8, queue_size=None):
+        self.fetch = fetch
+        self.workers = max(1, workers)
+        self.queue_size = queue_size or self.workers * 2
+        self.stopped = threading.Event()
+        self.reader_error = None
+
+    def stop(self):
+        self.stopped.set()
+
+    def put(self, target_queue, item):
+        # Blocks while the queue is full, which holds back the stage feeding it.
+        while not self.stopped.is_set():
+            try:
+                target_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read(self, items, work_queue):
+        try:
+            for item in items:
+                if not self.put(work_queue, item):
+                    break
+        except Exception as e:
+            self.reader_error = e
+            self.stop()
+        finally:
+            for _ in range(self.workers):
+                work_queue.put(DONE)
+
+    def fetch_items(self, work_queue, result_queue):
+        while True:
+            item = work_queue.get()
+            if item is DONE:
+                result_queue.put(DONE)
+                return
+            if self.stopped.is_set():
+                continue
+
+            try:
+                result_queue.put((item, self.fetch(item), None))
+            except Exception as e:
+                result_queue.put((item, None, e))
+
+    def run(self, items, apply):
+        work_queue = queue.Queue(maxsize=self.queue_size)
+        result_queue = queue.Queue(maxsize=self.queue_size)
+
+        threads = [threading.Thread(target=self.read, args=(items, work_queue), daemon=True)]
+        threads += [
+            threading.Thread(target=self.fetch_items, args=(work_queue, result_queue), daemon=True)
+            for _ in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        apply_error = None
+        finished_workers = 0
+        while finished_workers < self.workers:
+            entry = result_queue.get()
+            if entry is DONE:
+                finished_workers += 1
+            elif not self.stopped.is_set():
+                try:
+                    apply(*entry)
+                except Exception as e:
+                    # Keep draining so the fetch stage can shut down before the error is raised.
+                    apply_error = e
+                    self.stop()
+
+        for thread in threads:
+            thread.join()
+
+        if apply_error or self.reader_error:
+            raise apply_error or self.reader_error
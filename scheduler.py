@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+TERMINAL_STATUSES = {'delivered', 'returned to shipper'}
+
+# Base seconds between polls, keyed by the parcel's Recent Location.
+BASE_INTERVALS = {
+    'pending': 2 * 3600,
+    'pickup request sent': 12 * 3600,
+    'ready for return': 12 * 3600,
+    'being return': 12 * 3600,
+}
+DEFAULT_INTERVAL = 4 * 3600
+MIN_INTERVAL = 30 * 60
+MAX_INTERVAL = 48 * 3600
+
+
+def parse_booking_date(booking_date):
+    if isinstance(booking_date, datetime):
+        return booking_date
+    try:
+        return datetime.strptime(str(booking_date).strip(), '%d/%m/%Y')
+    except ValueError:
+        return None
+
+
+def poll_interval(recent_location, booking_date, changed_at, now):
+    status = (recent_location or '').strip().lower()
+    if status in TERMINAL_STATUSES:
+        return None
+
+    interval = BASE_INTERVALS.get(status, DEFAULT_INTERVAL)
+
+    booked_at = parse_booking_date(booking_date)
+    if booked_at:
+        age_days = (now - booked_at.timestamp()) / 86400
+        if age_days < 2:
+            interval *= 0.5
+        elif age_days > 10:
+            interval *= 3
+
+    unchanged_for = now - changed_at
+    if unchanged_for < 6 * 3600:
+        interval *= 0.5
+    elif unchanged_for > 3 * 86400:
+        interval *= 2
+
+    return min(MAX_INTERVAL, max(MIN_INTERVAL, interval))
+
+
+class PollScheduler:
+    def __init__(self, directory, file_name='poll_schedule.db'):
+        self.directory = directory
+        self.path = os.path.join(directory, file_name)
+        self.lock = threading.Lock()
+
+        try:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            with self.connection:
+                self.connection.execute(
+                    'CREATE TABLE IF NOT EXISTS schedule ('
+                    'cn TEXT PRIMARY KEY, recent_location TEXT, changed_at REAL, polled_at REAL, next_poll_at REAL)'
+                )
+        except sqlite3.Error as e:
+            raise Exception(f"Error opening poll schedule: {e}")
+
+    def due(self, track_numbers, now=None):
+        now = now or time.time()
+        track_numbers = [str(track_number) for track_number in track_numbers]
+        next_polls = {}
+
+        with self.lock:
+            for start in range(0, len(track_numbers), 500):
+                chunk = track_numbers[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                next_polls.update(self.connection.execute(
+                    f'SELECT cn, next_poll_at FROM schedule WHERE cn IN ({placeholders})', chunk
+                ).fetchall())
+
+        return {
+            track_number for track_number in track_numbers
+            if track_number not in next_polls
+            or (next_polls[track_number] is not None and next_polls[track_number] <= now)
+        }
+
+    def record(self, parcels, now=None):
+        now = now or time.time()
+        parcels = [(str(cn), recent_location, booking_date) for cn, recent_location, booking_date in parcels]
+
+        with self.lock, self.connection:
+            previous = {}
+            for start in range(0, len(parcels), 500):
+                chunk = [cn for cn, _, _ in parcels[start:start + 500]]
+                placeholders = ','.join('?' * len(chunk))
+                for cn, recent_location, changed_at in self.connection.execute(
+                        f'SELECT cn, recent_location, changed_at FROM schedule WHERE cn IN ({placeholders})', chunk):
+                    previous[cn] = (recent_location, changed_at)
+
+            rows = []
+            for cn, recent_location, booking_date in parcels:
+                previous_location, changed_at = previous.get(cn, (None, None))
+                if changed_at is None or previous_location != recent_location:
+                    changed_at = now
+
+                interval = poll_interval(recent_location, booking_date, changed_at, now)
+                next_poll_at = now + interval if interval is not None else None
+                rows.append((cn, recent_location, changed_at, now, next_poll_at))
+
+            self.connection.executemany('INSERT OR REPLACE INTO schedule VALUES (?, ?, ?, ?, ?)', rows)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,118 @@
+from openpyxl import load_workbook
+from xlsx_export import clean_value, write_rows
+from ledger import normalize_cn
+
+
+def to_number(value):
+    value = clean_value(value)
+    if isinstance(value, str):
+        try:
+            return float(value.replace(',', '')) if value.strip() else None
+        except ValueError:
+            return value
+    return value
+
+
+# Columns with a known type are converted once on load, so lookups and comparisons during a run see one type.
+COLUMN_TYPES = {
+    'CN #': normalize_cn,
+    'COD Amount': to_number,
+}
+
+
+class SheetModel:
+    def __init__(self, rows, file_path, ledger=None, from_ledger=False):
+        self.ledger = ledger
+        self.from_ledger = from_ledger
+        self.file_path = file_path
+        self.dirty = set()
+        # A model built from the ledger always exports on the final save, since the ledger may hold rows final.xlsx lacks.
+        self.unwritten = from_ledger
+
+        rows = iter(rows)
+        self.headers = [header for header in next(rows, ())]
+        width = len(self.headers)
+        rows = [tuple(row[:width]) + (None,) * (width - len(row)) for row in rows]
+        self.row_count = len(rows)
+
+        # Transposed in one pass rather than appended cell by cell.
+        columns = zip(*rows) if rows else [()] * width
+        self.columns = {header: list(values) for header, values in zip(self.headers, columns)}
+
+        for header, convert in COLUMN_TYPES.items():
+            if header in self.columns:
+                self.columns[header] = [convert(value) for value in self.columns[header]]
+
+    @classmethod
+    def load(cls, file_path, ledger=None):
+        # Read-only mode streams the sheet instead of building a cell object per value.
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            return cls(workbook.active.iter_rows(values_only=True), file_path, ledger)
+        finally:
+            workbook.close()
+
+    @classmethod
+    def from_ledger(cls, ledger, file_path, track_numbers=None):
+        # Holds the open partitions, or just the given parcels, in memory; checkpoints go to the ledger and save()
+        # exports the workbook once.
+        df = ledger.to_dataframe(open_only=True) if track_numbers is None else ledger.rows_for(track_numbers)
+        rows = [list(df.columns)] + [[clean_value(value) for value in row] for row in df.itertuples(index=False, name=None)]
+        return cls(rows, file_path, ledger, from_ledger=True)
+
+    def has_column(self, name):
+        return name in self.columns
+
+    def ensure_column(self, name):
+        if name not in self.columns:
+            self.headers.append(name)
+            self.columns[name] = [None] * self.row_count
+            self.unwritten = True
+
+    def column(self, name):
+        if name not in self.columns:
+            raise KeyError(f"The '{name}' column is not found in the sheet.")
+        return self.columns[name]
+
+    def get(self, name, index):
+        return self.column(name)[index]
+
+    def set(self, name, index, value):
+        column = self.column(name)
+        if column[index] != value:
+            column[index] = value
+            self.dirty.add((name, index))
+
+    def sheet_row(self, index):
+        return index + 2
+
+    def save(self, file_path=None, checkpoint=False):
+        # Only the dirty cells are pushed to the ledger. With a ledger behind it a checkpoint stops there; the workbook is
+        # streamed out once, on the final save, and only if something changed.
+        if self.dirty:
+            self.save_to_ledger()
+            self.dirty.clear()
+            self.unwritten = True
+
+        if checkpoint and self.ledger:
+            return True
+        if not self.unwritten:
+            return False
+
+        if self.from_ledger:
+            self.ledger.export(file_path or self.file_path)
+        else:
+            write_rows(file_path or self.file_path, self.headers, zip(*(self.columns[header] for header in self.headers)))
+        self.unwritten = False
+        return True
+
+    def save_to_ledger(self):
+        if not self.ledger:
+            return
+
+        # The ledger is the system of record, so it takes the changes before the workbook does.
+        updates = {}
+        for name, index in self.dirty:
+            updates.setdefault(index, {})[name] = self.columns[name][index]
+        track_numbers = self.column('CN #')
+        self.ledger.update_many((track_numbers[index], values) for index, values in updates.items())
@@ -1,146 +1,440 @@
 from PyQt5.QtCore import QThread, pyqtSignal
-from openpyxl import load_workbook
+import threading
+import time
+from collections import deque
+from batching import AdaptiveBatcher
+from leopard import ApiUnavailableError, CircuitOpenError
+from sheet_model import SheetModel
+from journal import RunJournal, journal_mode
+from pipeline import Pipeline
 
 class WorkerThread(QThread):
     progress = pyqtSignal(int)
     result = pyqtSignal(str)
     error = pyqtSignal(str)
 
-    def __init__(self, api, final_file_path, mode):
+    def __init__(self, api, final_file_path, mode, concurrency=8, scheduler=None, resume=False, checkpoint_interval=60,
+                 ledger=None, from_ledger=False, track_numbers=None):
         super().__init__()
         self.api = api
+        self.api.hold()
         self.final_file_path = final_file_path
         self.mode = mode
+        self.concurrency = max(1, int(concurrency))
+        self.scheduler = scheduler
+        self.ledger = ledger
+        self.from_ledger = from_ledger and ledger is not None
+        self.track_numbers = set(track_numbers) if track_numbers is not None else None
+        self.batcher = AdaptiveBatcher()
+        self.resume = resume
+        self.checkpoint_interval = checkpoint_interval
+        self.journal = None
+        self.last_checkpoint = None
+        self.pipeline = None
+        self.circuit_error = None
+        self.event_store_error_reported = False
+        self.highest_index = -1
+        self.progress_total = None
+        self.progress_done = 0
+        self.payment_queue = deque()
+        self.payment_condition = threading.Condition()
+        self.tracking_in_flight = 0
+        self.payments_done = set()
+
+    def start_journal(self, model):
+        self.journal = RunJournal(self.final_file_path, journal_mode(self.mode, batch=self.track_numbers is not None))
+        processed = {}
+
+        if self.resume:
+            index_by_track_number = {track_number: index for index, track_number in enumerate(model.column("CN #"))}
+            unmatched = []
+            for track_number, updates, kind in self.journal.entries():
+                processed.setdefault(kind or self.mode, set()).add(track_number)
+                index = index_by_track_number.get(track_number)
+                if index is None:
+                    unmatched.append((track_number, updates))
+                    continue
+                for column_name, value in updates.items():
+                    model.ensure_column(column_name)
+                    model.set(column_name, index, value)
 
-    def run_tracking(self):
-        try:
-            wb = load_workbook(self.final_file_path)
-            sheet = wb.active
+            # Entries for parcels this model does not hold (an earlier batch) go straight to the ledger, so finishing
+            # this run's journal does not drop them.
+            if unmatched and self.ledger:
+                self.ledger.update_many(unmatched)
 
-            if sheet.max_column < 3:
-                sheet.insert_cols(2, 2)
-                sheet.cell(row=1, column=2).value = "Status"
-                sheet.cell(row=1, column=3).value = "Recent Location"
+        self.journal.open(resume=self.resume)
+        self.last_checkpoint = time.monotonic()
+        return processed
 
-            total_rows = sheet.max_row - 1
-            if total_rows <= 0:
-                self.error.emit("No data to process.")
-                return
+    def checkpoint(self, model, updates, kind):
+        self.journal.record(updates, kind=kind if self.mode == "sync" else None)
+
+        if time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            try:
+                model.save(checkpoint=True)
+            except Exception:
+                # The journal still holds these updates, and the final save reports any lasting problem.
+                pass
+            self.last_checkpoint = time.monotonic()
 
-            progress_interval = max(1, total_rows // 100)
+    def report_progress(self, model, indices):
+        if self.progress_total:
+            self.progress_done += len(indices)
+            self.progress.emit(min(99, int(self.progress_done / self.progress_total * 100)))
+            return
 
-            for row in range(2, sheet.max_row + 1):
-                track_number = sheet.cell(row=row, column=1).value
-                current_status = sheet.cell(row=row, column=2).value
+        self.highest_index = max([self.highest_index] + list(indices))
+        self.progress.emit(int((self.highest_index + 1) / model.row_count * 100))
 
-                if current_status and current_status.lower() == "delivered":
-                    continue
+    def stop_on_circuit(self, api_error):
+        if isinstance(api_error, CircuitOpenError):
+            self.circuit_error = api_error
+            self.pipeline.stop()
+            return True
+        return False
+
+    def due_rows(self, rows):
+        if not self.scheduler or not rows:
+            return rows
+        due_track_numbers = self.scheduler.due([track_number for _, track_number in rows])
+        return [(index, track_number) for index, track_number in rows if track_number in due_track_numbers]
+
+    def read_tracking_batches(self, model, processed_track_numbers):
+        current_statuses = model.column("Recent Location")
+        candidates = []
+        due = []
+
+        for index, track_number in enumerate(model.column("CN #")):
+            current_status = current_statuses[index]
+
+            if current_status and str(current_status).lower() == "delivered":
+                continue
+
+            if track_number in processed_track_numbers:
+                continue
+
+            if self.track_numbers is not None and track_number not in self.track_numbers:
+                continue
+
+            if not track_number:
+                self.error.emit(f"Track number missing in row {model.sheet_row(index)}. Skipping...")
+                continue
 
-                if track_number:
-                    try:
-                        booked_packet_status, recent_status, booking_date = self.api.track_booked_packet(track_number)
+            candidates.append((index, track_number))
+            if len(candidates) >= 500:
+                due.extend(self.due_rows(candidates))
+                candidates = []
 
-                        if booked_packet_status:
-                            sheet.cell(row=row, column=2).value = booked_packet_status
-                        if recent_status:
-                            sheet.cell(row=row, column=3).value = recent_status
-                        if booking_date:
-                            sheet.cell(row=row, column=sheet.max_column - 1).value = booking_date
+            while len(due) >= 50:
+                yield due[:50]
+                due = due[50:]
 
-                    except Exception as api_error:
-                        self.error.emit(f"Failed to track packet {track_number}: {api_error}")
-                        continue
+        due.extend(self.due_rows(candidates))
+        for start in range(0, len(due), 50):
+            yield due[start:start + 50]
+
+    def read_payment_batches(self, model, processed_track_numbers, row_mapping):
+        payment_statuses = model.column("Payment Received")
+        pending_track_numbers = deque()
+
+        for index, track_number in enumerate(model.column("CN #")):
+            current_payment_status = payment_statuses[index]
+
+            if current_payment_status and str(current_payment_status).lower() == 'paid':
+                continue
+
+            if track_number in processed_track_numbers:
+                continue
+
+            if track_number:
+                pending_track_numbers.append(track_number)
+                row_mapping[track_number] = index
+
+            if len(pending_track_numbers) >= self.batcher.max_size:
+                yield self.batcher.take(pending_track_numbers)
+
+        while pending_track_numbers:
+            yield self.batcher.take(pending_track_numbers)
+
+    def fetch_tracking(self, batch):
+        # With a scheduler, a row only gets here when it is due, so a cached non-terminal result must not answer for it.
+        return self.api.track_booked_packets([track_number for _, track_number in batch], terminal_cache_only=self.scheduler is not None)
+
+    def fetch_payments(self, track_numbers):
+        started = time.monotonic()
+        try:
+            results = self.api.track_payment_status(','.join(track_numbers))
+            self.batcher.record(len(track_numbers), time.monotonic() - started, True)
+            return results, []
+        except CircuitOpenError:
+            raise
+        except ApiUnavailableError as api_error:
+            # Splitting cannot help when the endpoint itself is down; each half would only spend its own retries.
+            self.batcher.record(len(track_numbers), time.monotonic() - started, False)
+            return {}, [(track_number, api_error) for track_number in track_numbers]
+        except Exception as api_error:
+            self.batcher.record(len(track_numbers), time.monotonic() - started, False)
+            if len(track_numbers) == 1:
+                return {}, [(track_numbers[0], api_error)]
+
+        # Split the failing batch so one bad CN does not cost the whole batch.
+        middle = len(track_numbers) // 2
+        first_results, first_failures = self.fetch_payments(track_numbers[:middle])
+        second_results, second_failures = self.fetch_payments(track_numbers[middle:])
+        first_results.update(second_results)
+        return first_results, first_failures + second_failures
+
+    def apply_tracking(self, model, batch, tracking_results, api_error):
+        if self.stop_on_circuit(api_error):
+            return
+
+        if api_error:
+            self.error.emit(f"Failed to track packets for batch starting at row {model.sheet_row(batch[0][0])}: {api_error}")
+        else:
+            journal_updates = []
+            for index, track_number in batch:
+                booked_packet_status, recent_status, booking_date = tracking_results.get(track_number, (None, None, None))
+                updates = {}
+
+                if booked_packet_status:
+                    updates["Recent Location"] = booked_packet_status
+                if recent_status:
+                    updates["Status"] = recent_status
+                if booking_date:
+                    updates["Booking Date"] = booking_date
+
+                for column_name, value in updates.items():
+                    model.set(column_name, index, value)
+                journal_updates.append((track_number, updates))
+
+            if self.scheduler:
+                self.scheduler.record([
+                    (track_number, model.get("Recent Location", index), model.get("Booking Date", index))
+                    for index, track_number in batch
+                ])
+
+            self.checkpoint(model, journal_updates, "tracking")
+
+            if self.mode == "sync":
+                self.queue_payments(model, batch)
+
+        if self.mode == "sync":
+            with self.payment_condition:
+                self.tracking_in_flight -= 1
+                self.payment_condition.notify_all()
+
+        self.report_progress(model, [index for index, _ in batch])
+
+    def apply_payments(self, model, row_mapping, batch, payment_results, api_error):
+        if self.stop_on_circuit(api_error):
+            return
+
+        if api_error:
+            self.error.emit(f"Failed to track payment for {', '.join(batch)}: {api_error}")
+            return
+
+        parsed_results, failures = payment_results
+        journal_updates = []
+        for track_id, (payment_status, payment_date) in parsed_results.items():
+            if track_id in row_mapping:
+                if (payment_status == None):
+                    recent_status = '-'
                 else:
-                    self.error.emit(f"Track number missing in row {row}. Skipping...")
+                    recent_status = f'{payment_status} {payment_date}'.strip()
+                model.set("Payment Received", row_mapping[track_id], recent_status)
+                journal_updates.append((track_id, {"Payment Received": recent_status}))
+
+        if failures:
+            failed_track_numbers = ', '.join(track_number for track_number, _ in failures)
+            self.error.emit(f"Failed to track payment for {failed_track_numbers}: {failures[0][1]}")
+
+        failed_track_numbers = {track_number for track_number, _ in failures}
+        journal_updates.extend(
+            (track_number, {}) for track_number in batch
+            if track_number not in parsed_results and track_number not in failed_track_numbers
+        )
+        self.checkpoint(model, journal_updates, "payment")
+        self.report_progress(model, [row_mapping[track_number] for track_number in batch])
+
+    def is_paid(self, payment_status):
+        return bool(payment_status) and str(payment_status).lower() == 'paid'
+
+    def queue_payments(self, model, batch):
+        with self.payment_condition:
+            for index, track_number in batch:
+                if self.is_paid(model.get("Payment Received", index)) or track_number in self.payments_done:
+                    continue
 
-                if (row - 1) % progress_interval == 0 or row == sheet.max_row:
-                    progress = int((row - 1) / total_rows * 100)
-                    self.progress.emit(progress)
+                # Parcels that were just delivered are the ones most likely to have a new payment.
+                if str(model.get("Recent Location", index) or '').lower() == "delivered":
+                    self.payment_queue.appendleft(track_number)
+                else:
+                    self.payment_queue.append(track_number)
+            self.payment_condition.notify_all()
+
+    def read_sync_batches(self, model, processed):
+        tracking_batches = list(self.read_tracking_batches(model, processed.get("tracking", set())))
+        tracked_indices = {index for batch in tracking_batches for index, _ in batch}
+        self.payments_done = processed.get("payment", set())
+
+        untracked_rows = [
+            (index, track_number) for index, track_number in enumerate(model.column("CN #"))
+            if track_number and index not in tracked_indices
+        ]
+        self.queue_payments(model, untracked_rows)
+        self.progress_total = len(tracked_indices) + len(self.payment_queue) + sum(
+            1 for batch in tracking_batches for index, track_number in batch
+            if not self.is_paid(model.get("Payment Received", index)) and track_number not in self.payments_done
+        )
+
+        for batch in tracking_batches:
+            with self.payment_condition:
+                self.tracking_in_flight += 1
+            yield "tracking", batch
+
+            with self.payment_condition:
+                ready = len(self.payment_queue) >= self.batcher.size
+                payment_batch = self.batcher.take(self.payment_queue) if ready else None
+            if payment_batch:
+                yield "payment", payment_batch
+
+        while not self.pipeline.stopped.is_set():
+            with self.payment_condition:
+                while not self.payment_queue and self.tracking_in_flight and not self.pipeline.stopped.is_set():
+                    self.payment_condition.wait(0.1)
+
+                if not self.payment_queue:
+                    if not self.tracking_in_flight:
+                        return
+                    continue
+                payment_batch = self.batcher.take(self.payment_queue)
+            yield "payment", payment_batch
 
-            try:
-                wb.save(self.final_file_path)
-            except Exception as save_error:
-                self.error.emit(f"Failed to save the file: {save_error}")
+    def fetch_sync(self, item):
+        kind, batch = item
+        return self.fetch_tracking(batch) if kind == "tracking" else self.fetch_payments(batch)
+
+    def apply_sync(self, model, row_mapping, item, results, api_error):
+        kind, batch = item
+        if kind == "tracking":
+            self.apply_tracking(model, batch, results, api_error)
+        else:
+            self.apply_payments(model, row_mapping, batch, results, api_error)
+
+    def finish_run(self, model, completed_message, stopped_message):
+        try:
+            model.save()
+        except Exception as save_error:
+            self.error.emit(f"Failed to save the file, the run can be resumed: {save_error}")
+            return
+
+        if self.circuit_error:
+            self.error.emit(f"{stopped_message}, progress so far has been saved: {self.circuit_error}")
+            return
+
+        self.journal.finish()
+        self.result.emit(completed_message)
+        self.progress.emit(100)
+
+    def load_model(self):
+        if self.from_ledger:
+            return SheetModel.from_ledger(self.ledger, self.final_file_path, self.track_numbers)
+        return SheetModel.load(self.final_file_path, ledger=self.ledger)
+
+    def run_tracking(self):
+        try:
+            model = self.load_model()
+
+            if model.row_count <= 0:
+                self.error.emit("No data to process.")
                 return
 
-            self.result.emit(f"Status update completed. Data has been updated.")
-            self.progress.emit(100)
+            for column_name in ("Recent Location", "Status", "Booking Date"):
+                model.ensure_column(column_name)
+
+            processed_track_numbers = self.start_journal(model).get("tracking", set())
+            if self.track_numbers is not None:
+                self.progress_total = max(1, len(self.track_numbers - processed_track_numbers))
+
+            self.pipeline = Pipeline(self.fetch_tracking, workers=self.concurrency)
+            self.pipeline.run(
+                self.read_tracking_batches(model, processed_track_numbers),
+                lambda batch, tracking_results, api_error: self.apply_tracking(model, batch, tracking_results, api_error),
+            )
+
+            self.finish_run(model, "Status update completed. Data has been updated.", "Tracking stopped early")
 
         except Exception as e:
             self.error.emit(f"An unexpected error occurred: {e}")
 
     def run_payment(self):
         try:
-            wb = load_workbook(self.final_file_path)
-            sheet = wb.active
+            model = self.load_model()
 
-            if sheet.max_column < 10:
-                sheet.insert_cols(10)
-                sheet.cell(row=1, column=10).value = "Payment Status"
-
-            total_rows = sheet.max_row - 1
-            if total_rows <= 0:
+            if model.row_count <= 0:
                 self.error.emit("No data to process.")
                 return
 
-            progress_interval = max(1, total_rows // 100)
-
-            tracking_ids = []
+            model.ensure_column("Payment Received")
+            processed_track_numbers = self.start_journal(model).get("payment", set())
             row_mapping = {}
 
-            for row in range(2, sheet.max_row + 1):
-                track_number = sheet.cell(row=row, column=1).value
-                current_payment_status = sheet.cell(row=row, column=10).value
-
-                if current_payment_status and current_payment_status.lower() == 'paid':
-                    continue
+            self.pipeline = Pipeline(self.fetch_payments, workers=self.concurrency)
+            self.pipeline.run(
+                self.read_payment_batches(model, processed_track_numbers, row_mapping),
+                lambda batch, payment_results, api_error: self.apply_payments(model, row_mapping, batch, payment_results, api_error),
+            )
 
-                if track_number:
-                    tracking_ids.append(track_number)
-                    row_mapping[track_number] = row
+            self.finish_run(model, "Payment tracking completed. Data has been updated.", "Payment tracking stopped early")
 
-                if len(tracking_ids) == 50 or (row == sheet.max_row and tracking_ids):
-                    tracking_ids_str = ','.join(tracking_ids)
-                    try:
-                        parsed_results = self.api.track_payment_status(tracking_ids_str)
+        except Exception as e:
+            self.error.emit(f"An unexpected error occurred: {e}")
 
-                        for track_id, (payment_status, payment_date) in parsed_results.items():
-                            if track_id in row_mapping:
-                                if (payment_status == None):
-                                    recent_status = '-'
-                                else:
-                                    recent_status = f'{payment_status} {payment_date}'.strip()
-                                sheet.cell(row=row_mapping[track_id], column=10).value = recent_status
+    def run_sync(self):
+        try:
+            model = self.load_model()
 
-                        tracking_ids.clear()
-                        row_mapping.clear()
+            if model.row_count <= 0:
+                self.error.emit("No data to process.")
+                return
 
-                    except Exception as api_error:
-                        self.error.emit(f"Failed to track payment for batch starting at row {row - len(tracking_ids) + 1}: {api_error}")
-                        tracking_ids.clear()
-                        row_mapping.clear()
-                        continue
+            for column_name in ("Recent Location", "Status", "Booking Date", "Payment Received"):
+                model.ensure_column(column_name)
 
-                if (row - 1) % progress_interval == 0 or row == sheet.max_row:
-                    progress = int((row - 1) / total_rows * 100)
-                    self.progress.emit(progress)
+            processed = self.start_journal(model)
+            row_mapping = {track_number: index for index, track_number in enumerate(model.column("CN #")) if track_number}
 
-            try:
-                wb.save(self.final_file_path)
-            except Exception as save_error:
-                self.error.emit(f"Failed to save the file: {save_error}")
-                return
+            self.pipeline = Pipeline(self.fetch_sync, workers=self.concurrency)
+            self.pipeline.run(
+                self.read_sync_batches(model, processed),
+                lambda item, results, api_error: self.apply_sync(model, row_mapping, item, results, api_error),
+            )
 
-            self.result.emit("Payment tracking completed. Data has been updated.")
-            self.progress.emit(100)
+            self.finish_run(model, "Tracking and payment update completed. Data has been updated.", "Update stopped early")
 
         except Exception as e:
             self.error.emit(f"An unexpected error occurred: {e}")
 
+    def report_event_store_error(self, message):
+        # Reported once per run; a broken event store would otherwise fail the same way on every batch.
+        if not self.event_store_error_reported:
+            self.event_store_error_reported = True
+            self.error.emit(message)
+
     def run(self):
-        if self.mode == "tracking":
-            self.run_tracking()
-        elif self.mode == "payment":
-            self.run_payment()
-        else:
-            self.error.emit("Invalid operation mode selected.")
+        self.api.event_store_error_handler = self.report_event_store_error
+        try:
+            if self.mode == "tracking":
+                self.run_tracking()
+            elif self.mode == "payment":
+                self.run_payment()
+            elif self.mode == "sync":
+                self.run_sync()
+            else:
+                self.error.emit("Invalid operation mode selected.")
+        finally:
+            if self.journal:
+                self.journal.close()
+            self.api.event_store_error_handler = None
+            self.api.release()
@@ -1,9 +1,13 @@
 from PyQt5.QtWidgets import QMessageBox
 import os
 import socket
-from bs4 import BeautifulSoup
+from html.parser import HTMLParser
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 
+def is_loadsheet(file_path):
+    return file_path.lower().endswith('.xls')
+
 def rename_file_extension(file_path):
     file_name, current_extension = os.path.splitext(file_path)
     current_extension = current_extension[1:]
@@ -17,39 +21,106 @@ def rename_file_extension(file_path):
         os.rename(file_path, new_file_path)
         return f"Renamed {file_path} to {new_file_path}.", new_file_path
     except FileNotFoundError:
-        QMessageBox.warning(None, "File Not Found", f"The file {file_path} does not exist.")
-        return None, None
+        return f"The file {file_path} does not exist.", None
     except Exception as e:
-        QMessageBox.warning(None, "Error", f"An error occurred: {e}")
-        return None, None
+        return f"An error occurred: {e}", None
 
-def extract_data_from_html(file_path):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
+LOADSHEET_HEADERS = ["Sr.", "CN #", "Destination", "Shipper Name", "No. of pieces", "Consignee Name", "Order Id", "Weight", "COD Amount", "Remarks"]
+
+
+class LoadsheetParser(HTMLParser):
+    # Collects <td> text per <tr> as the HTML streams in, without building a document tree. Like find_all('td'),
+    # a row's cells include those of any table nested inside it, and the document's first <tr> is skipped.
+    def __init__(self):
+        super().__init__()
+        self.depth = 0
+        self.row_count = 0
+        self.open_rows = []
+        self.open_cells = []
+        self.rows = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            self.depth += 1
+        elif tag == 'tr':
+            self.close_row(self.depth)
+            self.open_rows.append((self.depth, self.row_count == 0, []))
+            self.row_count += 1
+        elif tag == 'td':
+            self.close_cell(self.depth)
+            positions = []
+            for _, _, cells in self.open_rows:
+                positions.append((cells, len(cells)))
+                cells.append('')
+            self.open_cells.append((self.depth, [], positions))
+
+    def handle_endtag(self, tag):
+        if tag == 'table':
+            self.close_row(self.depth)
+            self.depth = max(0, self.depth - 1)
+        elif tag == 'tr':
+            self.close_row(self.depth)
+        elif tag == 'td':
+            self.close_cell(self.depth)
+
+    def handle_data(self, data):
+        for _, text, _ in self.open_cells:
+            text.append(data)
 
-        soup = BeautifulSoup(content, 'html.parser')
-        rows = soup.find_all('tr')
+    def close_cell(self, depth):
+        # Closes the open cell at this table depth; an unclosed <td> ends where the next one starts.
+        while self.open_cells and self.open_cells[-1][0] >= depth:
+            _, text, positions = self.open_cells.pop()
+            value = ''.join(text).strip()
+            for cells, position in positions:
+                cells[position] = value
 
-        headers = ["Sr.", "CN #", "Destination", "Shipper Name", "No. of pieces", "Consignee Name", "Order Id", "Weight", "COD Amount", "Remarks"]
+    def close_row(self, depth):
+        self.close_cell(depth)
+        while self.open_rows and self.open_rows[-1][0] >= depth:
+            _, skip, cells = self.open_rows.pop()
+            if not skip and len(cells) == len(LOADSHEET_HEADERS) and cells[0] != "Sr.":
+                self.rows.append(cells)
 
-        data = []
-        for row in rows[1:]:
-            cells = row.find_all('td')
-            if len(cells) == 10:
-                if cells[0].text.strip() == "Sr.":
-                    continue
-                row_data = [cell.text.strip() for cell in cells]
-                data.append(row_data)
+    def take_rows(self):
+        rows, self.rows = self.rows, []
+        return rows
 
-        df = pd.DataFrame(data, columns=headers)
-        return df
+
+def iter_loadsheet_rows(file_path, chunk_size=64 * 1024):
+    parser = LoadsheetParser()
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for chunk in iter(lambda: file.read(chunk_size), ''):
+            parser.feed(chunk)
+            yield from parser.take_rows()
+    parser.close()
+    parser.close_row(0)
+    yield from parser.take_rows()
+
+
+def extract_data_from_html(file_path):
+    try:
+        return pd.DataFrame(list(iter_loadsheet_rows(file_path)), columns=LOADSHEET_HEADERS)
     except Exception as e:
         raise Exception(f"Error extracting data from HTML: {e}")
 
-def delete_temporary_files(html_file_path, output_file_path):
-    os.remove(html_file_path)
-    os.remove(output_file_path)
+def extract_data_from_html_files(file_paths, workers=None):
+    # Each loadsheet is parsed in its own process; results come back in file order as (path, df, error).
+    workers = workers or min(len(file_paths), os.cpu_count() or 1)
+    results = []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(extract_data_from_html, file_path) for file_path in file_paths]
+        for file_path, future in zip(file_paths, futures):
+            try:
+                results.append((file_path, future.result(), None))
+            except Exception as e:
+                results.append((file_path, None, e))
+    return results
+
+def delete_temporary_files(*file_paths):
+    for file_path in file_paths:
+        os.remove(file_path)
         
 
 def is_connected(host="8.8.8.8", port=53, timeout=3):
@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+import time
+from PyQt5.QtCore import QThread, pyqtSignal
+from utils import is_loadsheet
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    # Without watchdog the watcher falls back to rescanning the folder.
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class IngestManifest:
+    def __init__(self, directory, file_name='ingest_manifest.json'):
+        self.path = os.path.join(directory, file_name)
+        self.lock = threading.Lock()
+        self.entries = {}
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    @staticmethod
+    def key(file_path):
+        return os.path.normcase(os.path.abspath(file_path))
+
+    def is_processed(self, file_path, size, mtime):
+        with self.lock:
+            entry = self.entries.get(self.key(file_path))
+        return entry is not None and entry['size'] == size and entry['mtime'] == mtime
+
+    def mark(self, file_stats):
+        with self.lock:
+            for file_path, (size, mtime) in file_stats.items():
+                self.entries[self.key(file_path)] = {
+                    'size': size, 'mtime': mtime, 'ingested_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+                }
+
+            temp_path = f'{self.path}.tmp'
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.entries, f, indent=1)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                raise Exception(f"Error saving ingest manifest: {e}")
+
+
+class LoadsheetEventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_created(self, event):
+        self.watcher.notice(event.src_path)
+
+    def on_modified(self, event):
+        self.watcher.notice(event.src_path)
+
+    def on_moved(self, event):
+        # Browsers download to a temporary name and rename to .xls when done.
+        self.watcher.notice(event.dest_path)
+
+
+class FolderWatcher(QThread):
+    loadsheets_ready = pyqtSignal(list)
+    problem = pyqtSignal(str)
+
+    def __init__(self, directory, settle_seconds=3, poll_interval=5, rescan_interval=60, use_notifications=True):
+        super().__init__()
+        self.directory = directory
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.use_notifications = use_notifications
+        self.manifest = IngestManifest(directory)
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.candidates = {}
+        self.handed_off = {}
+
+    def notice(self, file_path):
+        if not is_loadsheet(file_path):
+            return
+        with self.lock:
+            if file_path not in self.handed_off:
+                self.candidates.setdefault(file_path, None)
+
+    def scan(self):
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        self.notice(entry.path)
+        except OSError as e:
+            self.problem.emit(f"scan failed: {e}")
+
+    def settled(self):
+        # A file is handed off once its size and mtime have held still for settle_seconds and it can be opened,
+        # which skips downloads that are still being written.
+        now = time.monotonic()
+        ready = {}
+
+        with self.lock:
+            for file_path, seen in list(self.candidates.items()):
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    del self.candidates[file_path]
+                    continue
+
+                signature = (stat.st_size, stat.st_mtime)
+                if self.manifest.is_processed(file_path, *signature):
+                    del self.candidates[file_path]
+                    continue
+
+                if seen is None or seen[0] != signature:
+                    self.candidates[file_path] = (signature, now)
+                    continue
+
+                if stat.st_size == 0 or now - seen[1] < self.settle_seconds:
+                    continue
+
+                try:
+                    with open(file_path, 'rb'):
+                        pass
+                except OSError:
+                    continue
+
+                del self.candidates[file_path]
+                self.handed_off[file_path] = signature
+                ready[file_path] = signature
+
+        return ready
+
+    def mark_processed(self, file_paths):
+        with self.lock:
+            file_stats = {file_path: self.handed_off.pop(file_path) for file_path in file_paths if file_path in self.handed_off}
+        if file_stats:
+            self.manifest.mark(file_stats)
+
+    def release(self, file_paths):
+        # Files that could not be ingested this time are picked up again on the next scan.
+        with self.lock:
+            for file_path in file_paths:
+                self.handed_off.pop(file_path, None)
+
+    def run(self):
+        observer = None
+        if Observer is not None and self.use_notifications:
+            try:
+                observer = Observer()
+                observer.schedule(LoadsheetEventHandler(self), self.directory, recursive=False)
+                observer.start()
+            except Exception as e:
+                self.problem.emit(f"file notifications unavailable, polling instead: {e}")
+                observer = None
+
+        scan_interval = self.rescan_interval if observer else self.poll_interval
+        self.scan()
+        last_scan = time.monotonic()
+
+        try:
+            while not self.stopping.wait(0.5):
+                if time.monotonic() - last_scan >= scan_interval:
+                    self.scan()
+                    last_scan = time.monotonic()
+
+                ready = self.settled()
+                if ready:
+                    self.loadsheets_ready.emit(sorted(ready))
+        finally:
+            if observer:
+                observer.stop()
+                observer.join()
+
+    def stop(self):
+        self.stopping.set()
+        self.wait()
@@ -0,0 +1,80 @@
+import os
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.styles import PatternFill
+from openpyxl.utils import get_column_letter
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.formatting.formatting import ConditionalFormattingList
+
+YELLOW_FILL = PatternFill(start_color="FFFFCC", end_color="FFFFCC", fill_type="solid")
+GREEN_FILL = PatternFill(start_color="CCFFCC", end_color="CCFFCC", fill_type="solid")
+RED_FILL = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
+
+# (column, formula, fill) in priority order. {cell} is the first data cell of the column; a rule that
+# matches stops the rules after it on that column.
+FORMAT_RULES = [
+    ('COD Amount', 'AND(ISNUMBER({cell}),{cell}>5000)', YELLOW_FILL),
+    ('Status', 'ISNUMBER(SEARCH("delivered",{cell}))', GREEN_FILL),
+    ('Recent Location', 'OR(ISNUMBER(SEARCH("return",{cell})),ISNUMBER(SEARCH("pending",{cell})))', RED_FILL),
+    ('Payment Received', 'ISNUMBER(SEARCH("paid",{cell}))', GREEN_FILL),
+    ('Payment Received', 'ISNUMBER(SEARCH("pending",{cell}))', YELLOW_FILL),
+    ('Payment Received', 'TRUE', RED_FILL),
+]
+
+
+def clean_value(value):
+    if value is None:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value.item() if hasattr(value, 'item') else value
+
+
+def apply_format_rules(sheet, headers, row_count):
+    # Rules cover only the rows written, so the catch-all rule does not paint the empty rows below the data.
+    sheet.conditional_formatting = ConditionalFormattingList()
+    if row_count <= 0:
+        return
+
+    for column_name, formula, fill in FORMAT_RULES:
+        if column_name not in headers:
+            continue
+        column_letter = get_column_letter(headers.index(column_name) + 1)
+        cell = f'{column_letter}2'
+        sheet.conditional_formatting.add(
+            f'{cell}:{column_letter}{row_count + 1}',
+            FormulaRule(formula=[formula.format(cell=cell)], fill=fill, stopIfTrue=True)
+        )
+
+
+def write_rows(file_path, headers, rows, lengths=None, styled=False):
+    # Write-only workbooks stream each row to disk as it is appended, so memory does not grow with the row count.
+    # Widths have to be set before the first row goes out; the formatting rules are added once the row count is known.
+    # Only values are written, so fills left on cells by older versions of the sheet are dropped.
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+
+    if lengths is not None:
+        for index, (header, length) in enumerate(zip(headers, lengths), 1):
+            sheet.column_dimensions[get_column_letter(index)].width = max(len(str(header)), length or 0) + 2
+    sheet.append(headers)
+    row_count = 0
+    for row in rows:
+        sheet.append([clean_value(value) for value in row])
+        row_count += 1
+
+    if styled:
+        apply_format_rules(sheet, headers, row_count)
+
+    # Saving to a side file first keeps the previous workbook intact if the write fails midway.
+    temp_path = f'{file_path}.tmp'
+    try:
+        workbook.save(temp_path)
+        os.replace(temp_path, file_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+